@@ -1,7 +1,10 @@
-import json
-import os
 from math import isfinite
 
+import metrics
+from preference_store import FIELDS, open_store
+
+PREFS_DB = "learning.db"
+
 
 class AgentPreferences:
     DEFAULT = {
@@ -10,29 +13,27 @@ class AgentPreferences:
         "w_budget": 0.2
     }
 
-    def __init__(self, user_id="default_user", path="learning.json"):
+    def __init__(self, user_id="default_user", path=PREFS_DB, store=None):
         self.user_id = user_id
         self.path = path
+        self.store = store or open_store(path)
 
         self.w_roi = self.DEFAULT["w_roi"]
         self.w_risk = self.DEFAULT["w_risk"]
         self.w_budget = self.DEFAULT["w_budget"]
         self.interactions = 0
+        self._listeners = []
 
         self.load()
 
-    def load(self):
-        if not os.path.exists(self.path):
-            return
-
-        with open(self.path, "r") as f:
-            data = json.load(f)
+    def add_listener(self, callback):
+        self._listeners.append(callback)
 
-        users = data.get("users", {})
-        u = users.get(self.user_id)
-        if not u:
-            return
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
 
+    def _set(self, u):
         self.w_roi = float(u.get("w_roi", self.w_roi))
         self.w_risk = float(u.get("w_risk", self.w_risk))
         self.w_budget = float(u.get("w_budget", self.w_budget))
@@ -40,22 +41,32 @@ class AgentPreferences:
 
         self.normalize()
 
-    def save(self):
-        data = {"users": {}}
+    def _record(self):
+        return {f: getattr(self, f) for f in FIELDS}
 
-        if os.path.exists(self.path):
-            with open(self.path, "r") as f:
-                data = json.load(f)
-
-        data["users"][self.user_id] = {
-            "w_roi": self.w_roi,
-            "w_risk": self.w_risk,
-            "w_budget": self.w_budget,
-            "interactions": self.interactions
-        }
+    def load(self):
+        u = self.store.get(self.user_id)
+        if not u:
+            return
+        self._set(u)
 
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=2)
+    def save(self):
+        with metrics.span("prefs.save"):
+            self.store.put(self.user_id, self._record())
+
+    def _apply(self, adjust):
+        # Adjust the stored weights inside the store's write transaction, so
+        # another app instance's update is built on instead of overwritten.
+        def change(current):
+            if current:
+                self._set(current)
+            adjust()
+            self.normalize()
+            return self._record()
+
+        with metrics.span("prefs.update"):
+            self.store.update(self.user_id, change)
+        self._notify()
 
     def normalize(self):
         t = self.w_roi + self.w_risk + self.w_budget
@@ -65,6 +76,12 @@ class AgentPreferences:
             self.w_budget /= t
 
     def update_from_choice(self, prop, budget):
+        self._apply(lambda: self._adjust_for_choice(prop, budget))
+
+    def update_from_rejection(self, props, budget):
+        self._apply(lambda: self._adjust_for_rejection(props, budget))
+
+    def _adjust_for_choice(self, prop, budget):
         self.interactions += 1
 
         if prop.get("roi", 0) >= 0.15:
@@ -84,10 +101,7 @@ class AgentPreferences:
             elif diff >= 0.40:
                 self.w_budget -= 0.03
 
-        self.normalize()
-        self.save()
-
-    def update_from_rejection(self, props, budget):
+    def _adjust_for_rejection(self, props, budget):
         self.interactions += 1
         self.w_roi -= 0.02
 
@@ -103,6 +117,3 @@ class AgentPreferences:
             elif avg_diff <= 0.15:
                 self.w_budget -= 0.02
 
-        self.normalize()
-        self.save()
-    
\ No newline at end of file
@@ -0,0 +1,72 @@
+import argparse
+import time
+
+import pandas as pd
+
+from agent import PREFS_DB, AgentPreferences
+from data import load_properties
+from model import recommend_batch
+from preference_store import open_store
+
+OUT_CSV = "batch_recommendations.csv"
+
+
+def read_queries(path):
+    # One saved search per row: user_id, budget, city, property_type.
+    # Blank city/type mean "Any" and a blank budget means no budget.
+    q = pd.read_csv(path, dtype=str).fillna("")
+    for col in ("budget", "city", "property_type"):
+        if col not in q:
+            q[col] = ""
+    budget = pd.to_numeric(q["budget"], errors="coerce")
+    return [
+        (u.strip().lower(), None if pd.isna(b) else float(b), c.strip() or "Any", t.strip() or "Any")
+        for u, b, c, t in zip(q["user_id"], budget, q["city"], q["property_type"])
+    ]
+
+
+def main(queries_csv, out_csv=OUT_CSV, properties="properties.xlsx", prefs_path=PREFS_DB, top_k=10):
+    started = time.perf_counter()
+    df = load_properties(properties)
+    queries = read_queries(queries_csv)
+
+    store = open_store(prefs_path)
+    prefs = {u: AgentPreferences(u, store=store) for u in sorted({q[0] for q in queries})}
+    store.close()
+    print(f"{len(queries):,} queries from {len(prefs):,} users over {len(df):,} listings")
+
+    t = time.perf_counter()
+    results = recommend_batch(df, queries, prefs, k=top_k)
+    scoring = time.perf_counter() - t
+
+    rows = []
+    for qi, ((user_id, budget, city, ptype), picks) in enumerate(zip(queries, results)):
+        for rank, p in enumerate(picks, start=1):
+            rows.append({
+                "query": qi, "user_id": user_id, "budget": budget,
+                "filter_city": city, "filter_type": ptype, "rank": rank,
+                "name": p["name"], "city": p["city"], "property_type": p["type"],
+                "price": p["price"], "expected_roi": p["roi"], "risk": p["risk_text"], "url": p["url"],
+            })
+    pd.DataFrame(rows, columns=[
+        "query", "user_id", "budget", "filter_city", "filter_type", "rank",
+        "name", "city", "property_type", "price", "expected_roi", "risk", "url",
+    ]).to_csv(out_csv, index=False)
+
+    print(f"Scored in {scoring:.2f}s; wrote {len(rows):,} rows to {out_csv!r} "
+          f"in {time.perf_counter() - started:.2f}s total.")
+    return len(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Top-k recommendations for many users' saved searches at once.")
+    parser.add_argument("queries_csv", help="CSV with user_id, budget, city, property_type columns")
+    parser.add_argument("--out-csv", default=OUT_CSV)
+    parser.add_argument("--properties", default="properties.xlsx")
+    parser.add_argument("--prefs-path", default=PREFS_DB, help="learning.db, or a .json preference file")
+    parser.add_argument("--top-k", type=int, default=10)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(**vars(parse_args()))
@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from agent import AgentPreferences
+from preference_store import JsonPreferenceStore, SqlitePreferenceStore
+
+
+def _record(rng):
+    return {"w_roi": rng.random(), "w_risk": rng.random(), "w_budget": rng.random(),
+            "interactions": rng.randrange(100)}
+
+
+def populate(store, users, rng, batch=50_000):
+    for start in range(0, users, batch):
+        store.put_many([(f"user{i}", _record(rng)) for i in range(start, min(start + batch, users))])
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return pick(0.50), pick(0.95)
+
+
+def measure(store, users, rng, ops):
+    timings = {"load": [], "save": [], "choice": []}
+    prop = {"roi": 0.2, "risk_text": "Low Risk", "price": 100}
+    for _ in range(ops):
+        user_id = f"user{rng.randrange(users)}"
+
+        t = time.perf_counter()
+        prefs = AgentPreferences(user_id, store=store)
+        timings["load"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        prefs.save()
+        timings["save"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        prefs.update_from_choice(prop, 100)
+        timings["choice"].append(time.perf_counter() - t)
+    return {name: _percentiles(samples) for name, samples in timings.items()}
+
+
+def main(users=(10, 10_000, 1_000_000), ops=200, json_max_users=10_000, seed=0):
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="prefs_bench_")
+    rows = []
+    try:
+        for n in users:
+            backends = [("sqlite", lambda: SqlitePreferenceStore(os.path.join(workdir, f"{n}.db")))]
+            if n <= json_max_users:
+                backends.append(("json", lambda: JsonPreferenceStore(os.path.join(workdir, f"{n}.json"))))
+
+            for name, make in backends:
+                store = make()
+                t = time.perf_counter()
+                populate(store, n, rng)
+                fill = time.perf_counter() - t
+
+                result = measure(store, n, rng, ops)
+                store.close()
+                rows.append((n, name, fill, result))
+                print(f"{n:>9,} users  {name:6s}  fill {fill:6.2f}s  " + "  ".join(
+                    f"{op} p50 {p50:7.3f}ms p95 {p95:7.3f}ms" for op, (p50, p95) in result.items()))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load/save latency of the preference stores.")
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 10_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=200, help="timed operations per size")
+    parser.add_argument("--json-max-users", type=int, default=10_000,
+                        help="skip the JSON store above this many users")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(**vars(parse_args()))
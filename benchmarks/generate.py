@@ -0,0 +1,164 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Raw listings shaped like the scrape clean_data.py reads: thousands
+# separators, "sqft / sqm" sizes, "studio" and "3+ maid" bedrooms, and
+# "project, neighbourhood, city, governorate" locations of varying depth.
+# A fraction of rows is missing price or location so the drop step has work,
+# a few prices are mistyped so the outlier flags have work, and some rows
+# are reposts of others so the dedup step has work.
+
+LOCATIONS = [
+    ("Mivida", "5th Settlement Compounds", "The 5th Settlement", "New Cairo City", "Cairo"),
+    ("Stone Park", "New Cairo City", "Cairo"),
+    ("Mountain View iCity", "New Cairo City", "Cairo"),
+    ("Palm Hills October", "6 October City", "Giza"),
+    ("Palm Hills", "Sheikh Zayed City", "Giza"),
+    ("Beverly Hills", "Sheikh Zayed Compounds", "Sheikh Zayed City", "Giza"),
+    ("Marassi", "Sidi Abdel Rahman", "North Coast"),
+    ("Hacienda Bay", "Sidi Abdel Rahman", "North Coast"),
+    ("Telal Sokhna", "Ain Sokhna", "Suez"),
+    ("El Gouna", "Hurghada", "Red Sea"),
+    ("R7", "New Capital City", "Cairo"),
+    ("Maadi", "Cairo"),
+    ("Smouha", "Alexandria"),
+    ("Zamalek", "Cairo"),
+    ("Nasr City", "Cairo"),
+    ("Cairo",),
+]
+
+# (raw label, weight, log-price mean, sqm range)
+TYPES = [
+    ("Apartment", 40, 15.2, (60, 250)),
+    ("Villa", 12, 16.6, (200, 800)),
+    ("Townhouse", 8, 16.1, (180, 350)),
+    ("Twin House", 7, 16.3, (200, 400)),
+    ("Chalet", 10, 15.3, (50, 180)),
+    ("Duplex", 7, 15.9, (150, 400)),
+    ("Penthouse", 5, 15.8, (120, 350)),
+    ("iVilla", 4, 15.9, (180, 300)),
+    ("Cabin", 2, 14.9, (40, 90)),
+    ("Hotel Apartment", 2, 15.4, (50, 150)),
+    ("Land", 1, 16.0, (300, 2000)),
+    ("Palace", 1, 17.5, (800, 3000)),
+    ("Full Floor", 1, 16.0, (250, 600)),
+]
+
+BEDROOMS = ["studio", "1", "2", "3", "3", "4", "5", "3+ maid", "4+ maid", "7+", ""]
+BATHROOMS = ["1", "2", "2", "3", "4", "5", "none", "7+", ""]
+DATES = ["", "", "Ready", "01/10/2024", "15/03/2025", "30/06/2025", "31/12/2026", "2025-09-01"]
+
+# Share of rows whose price has two extra zeros or was typed in thousands,
+# and share of rows that repost another row.
+TYPO_SHARE = 0.004
+REPOST_SHARE = 0.03
+
+COLUMNS = ["url", "type", "price", "location", "bedrooms", "bathrooms", "size",
+           "available_from", "down_payment"]
+
+
+def _pick(rng, options, n, weights=None):
+    p = None
+    if weights is not None:
+        p = np.asarray(weights, dtype=float)
+        p /= p.sum()
+    return np.asarray(options, dtype=object)[rng.choice(len(options), n, p=p)]
+
+
+def _thousands(values):
+    return pd.Series(values).map("{:,}".format).to_numpy(dtype=object)
+
+
+def make_raw(rows, seed=0, start=0):
+    rng = np.random.default_rng([seed, start])
+    n = rows
+
+    t = rng.choice(len(TYPES), n, p=np.array([w for _, w, _, _ in TYPES]) / sum(w for _, w, _, _ in TYPES))
+    label = np.array([x[0] for x in TYPES], dtype=object)[t]
+    mean = np.array([x[2] for x in TYPES])[t]
+    lo = np.array([x[3][0] for x in TYPES])[t]
+    hi = np.array([x[3][1] for x in TYPES])[t]
+
+    price = np.round(rng.lognormal(mean, 0.45), -3).astype(np.int64)
+    typo = rng.random(n)
+    price = np.where(typo < TYPO_SHARE / 2, price * 100, price)
+    price = np.where((typo >= TYPO_SHARE / 2) & (typo < TYPO_SHARE), np.maximum(price // 1000, 1), price)
+    price_text = _thousands(price)
+    style = rng.random(n)
+    price_text = np.where(style < 0.15, "EGP " + price_text, price_text)
+    price_text = np.where((style >= 0.15) & (style < 0.25), price_text + " EGP", price_text)
+    price_text = np.where(style > 0.985, "Ask for price", price_text)
+
+    sqm = rng.uniform(lo, hi).astype(np.int64)
+    sqft = np.round(sqm * 10.7639).astype(np.int64)
+    size = np.where(rng.random(n) < 0.8,
+                    _thousands(sqft) + " sqft / " + sqm.astype(str).astype(object) + " sqm",
+                    sqm.astype(str).astype(object) + " sqm")
+
+    loc = np.array([", ".join(parts) for parts in LOCATIONS], dtype=object)
+    location = _pick(rng, loc, n)
+    location = np.where(rng.random(n) < 0.01, "", location)
+
+    down = np.round(price * rng.uniform(0.05, 0.3, n), -3).astype(np.int64)
+    down_text = np.where(rng.random(n) < 0.5, _thousands(down) + " EGP", "")
+
+    frame = pd.DataFrame({
+        "url": [f"https://www.propertyfinder.eg/en/plp/buy/listing-{start + i}.html" for i in range(n)],
+        "type": label,
+        "price": price_text,
+        "location": location,
+        "bedrooms": _pick(rng, BEDROOMS, n),
+        "bathrooms": _pick(rng, BATHROOMS, n),
+        "size": size,
+        "available_from": _pick(rng, DATES, n),
+        "down_payment": down_text,
+    }, columns=COLUMNS)
+    return _repost(rng, frame, REPOST_SHARE).replace("", np.nan)
+
+
+def _repost(rng, frame, share):
+    # Copies of random rows over other rows, each keeping its own url: the
+    # price moves by up to 1% and the location may be retyped in another
+    # case or spacing, as when a broker lists the same unit again.
+    n = int(len(frame) * share)
+    if not n:
+        return frame
+    dst = rng.choice(len(frame), n, replace=False)
+    copies = frame.iloc[rng.choice(len(frame), n)].copy()
+    price = pd.to_numeric(copies["price"].str.replace(r"[^0-9]", "", regex=True), errors="coerce")
+    moved = np.round(price * rng.uniform(0.99, 1.01, n), -3)
+    copies["price"] = np.where(price.notna() & (moved > 0), _thousands(moved.fillna(0).astype(np.int64)),
+                               copies["price"])
+    edit = rng.random(n)
+    location = copies["location"]
+    copies["location"] = np.where(edit < 0.3, location.str.upper(),
+                                  np.where(edit < 0.5, location.str.replace(", ", " , ", n=1), location))
+    copies["url"] = frame["url"].to_numpy()[dst]
+    frame.iloc[dst] = copies.to_numpy()
+    return frame
+
+
+def write_raw(path, rows, seed=0, chunk_rows=500_000):
+    # Chunks are seeded by (seed, first row), so a given row count and seed
+    # always produce the same file.
+    for start in range(0, rows, chunk_rows):
+        chunk = make_raw(min(chunk_rows, rows - start), seed, start)
+        chunk.to_csv(path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+    if rows == 0:
+        pd.DataFrame(columns=COLUMNS).to_csv(path, index=False)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic raw listings CSV.")
+    parser.add_argument("out_csv")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    write_raw(args.out_csv, args.rows, args.seed)
@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import server
+
+# Closed-loop load against server.py on localhost: each of `concurrency`
+# clients keeps one keep-alive connection and sends its next request as soon
+# as the previous answer arrives. A share of requests are preference updates.
+
+
+class Client:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        length = next(int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length:"))
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def wait_until_up(host, port, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        client = Client(host, port)
+        try:
+            status, body = await client.request("GET", "/health")
+            if status == 200:
+                return body
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+        finally:
+            client.close()
+
+
+def _make_request(rng, meta, users, update_ratio):
+    user = f"load{rng.randrange(users)}"
+    if rng.random() < update_ratio:
+        prop = {"roi": rng.uniform(0.05, 0.22), "risk_text": rng.choice(["Low Risk", "Medium Risk", "High Risk"]),
+                "price": rng.uniform(1e6, 2e7)}
+        return "/choice", {"user_id": user, "property": prop, "budget": rng.choice([None, 5e6])}
+
+    return "/recommend", {
+        "user_id": user,
+        "budget": rng.choice([None, 2e6, 5e6, 1e7]),
+        "city": rng.choice(["Any"] + meta["cities"][:8]),
+        "type": rng.choice(["Any", "Any"] + meta["types"][:4]),
+        "mode": rng.choice([None, None, None, "roi", "price"]),
+        "k": 3,
+    }
+
+
+async def run_load(host, port, requests, concurrency, users, update_ratio, seed):
+    probe = Client(host, port)
+    _, meta = await probe.request("GET", "/meta")
+    _, before = await probe.request("GET", "/stats")
+
+    rng = random.Random(seed)
+    plan = [_make_request(rng, meta, users, update_ratio) for _ in range(requests)]
+    latencies = {"/recommend": [], "/choice": []}
+    errors = 0
+    next_item = iter(plan)
+
+    async def worker():
+        nonlocal errors
+        client = Client(host, port)
+        try:
+            for path, payload in next_item:
+                t = time.perf_counter()
+                status, _ = await client.request("POST", path, payload)
+                latencies[path].append(time.perf_counter() - t)
+                errors += status != 200
+        finally:
+            client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    _, after = await probe.request("GET", "/stats")
+    probe.close()
+
+    batches = after["batches"] - before["batches"]
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 1),
+        "mean_batch_size": round((after["batched_queries"] - before["batched_queries"]) / max(batches, 1), 2),
+    }
+    for path, samples in latencies.items():
+        if samples:
+            ms = np.asarray(samples) * 1000
+            result[path] = {"count": len(samples), **{
+                f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 95, 99)
+            }, "max_ms": round(float(ms.max()), 3)}
+    return result
+
+
+def main(properties="properties.xlsx", host=server.HOST, port=server.PORT, requests=5000, concurrency=64,
+         users=500, update_ratio=0.05, window_ms=5.0, max_batch=256, spawn=True, seed=0, out=None):
+    proc = None
+    if spawn:
+        # Throwaway preference DB so load runs don't touch real profiles.
+        prefs = os.path.join(os.path.dirname(os.path.abspath(properties)), "loadgen_prefs.db")
+        proc = subprocess.Popen([
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(server.__file__)), "server.py"),
+            "--properties", properties, "--prefs-path", prefs, "--host", host, "--port", str(port),
+            "--window-ms", str(window_ms), "--max-batch", str(max_batch),
+        ])
+    try:
+        asyncio.run(wait_until_up(host, port))
+        result = asyncio.run(run_load(host, port, requests, concurrency, users, update_ratio, seed))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(prefs + suffix):
+                    os.remove(prefs + suffix)
+
+    result["window_ms"] = window_ms
+    print(json.dumps(result, indent=2))
+    if out:
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the local recommendation server.")
+    parser.add_argument("--properties", default="properties.xlsx")
+    parser.add_argument("--host", default=server.HOST)
+    parser.add_argument("--port", type=int, default=server.PORT)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--update-ratio", type=float, default=0.05, help="share of requests that are /choice updates")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--no-spawn", dest="spawn", action="store_false",
+                        help="target an already running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(**vars(parse_args()))
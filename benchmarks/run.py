@@ -0,0 +1,276 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Excel sheets stop at 1,048,576 rows; larger runs time the snapshot only.
+EXCEL_MAX_ROWS = 1_048_575
+
+# Above this many rows the clean stage streams the raw CSV in chunks sized to
+# --max-memory-mb instead of loading it whole (about 4x its size in memory).
+STREAM_ROWS = 1_000_000
+
+RESULTS = "benchmark_results.json"
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _latency(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+    }
+
+
+def _throughput(rows, seconds):
+    return {"seconds": round(seconds, 4), "rows": rows, "rows_per_s": round(rows / max(seconds, 1e-9), 1)}
+
+
+def bench_generate(paths, options):
+    from benchmarks.generate import write_raw
+
+    t = time.perf_counter()
+    write_raw(paths["raw"], options["rows"], options["seed"])
+    return _throughput(options["rows"], time.perf_counter() - t)
+
+
+def bench_clean(paths, options):
+    import clean_data
+
+    streamed = options["rows"] > STREAM_ROWS
+    t = time.perf_counter()
+    rows = clean_data.main(paths["raw"], paths["cleaned"], workers=options["workers"],
+                           max_memory_mb=options["max_memory_mb"] if streamed else None)
+    result = _throughput(options["rows"], time.perf_counter() - t)
+    result["rows_out"] = rows
+    result["streamed"] = streamed
+    return result
+
+
+def bench_features(paths, options):
+    import preprocess_and_features as features
+
+    skip_excel = options["rows"] > EXCEL_MAX_ROWS
+    t = time.perf_counter()
+    rows = features.main(paths["cleaned"], paths["outfile"], workers=options["workers"],
+                         skip_excel=skip_excel)
+    result = _throughput(rows, time.perf_counter() - t)
+    result["excel"] = not skip_excel
+    return result
+
+
+def bench_load(paths, options):
+    from data import load_properties, memory_report
+
+    t = time.perf_counter()
+    df = load_properties(paths["outfile"])
+    result = _throughput(len(df), time.perf_counter() - t)
+    result["dataset_mb"] = round(float(memory_report(df).sum()) / 2**20, 1)
+    return result
+
+
+def _queries(df):
+    # Filters from broad to narrow, picked from the data so they match
+    # something at every size.
+    cities = df["city"].value_counts()
+    top_city, rare_city = cities.index[0], cities.index[-1]
+    in_city = df[df["city"] == top_city]
+    top_type = in_city["property_type"].value_counts().index[0]
+    bucket = in_city[in_city["property_type"] == top_type]
+    return {
+        "all": (0, "Any", "Any"),
+        "budget": (float(df["price"].median()), "Any", "Any"),
+        "city": (0, top_city, "Any"),
+        "city_type_budget": (float(bucket["price"].median()), top_city, top_type),
+        "rare_city": (0, rare_city, "Any"),
+    }
+
+
+def bench_recommend(paths, options):
+    from agent import AgentPreferences
+    from data import load_properties
+    from model import invalidate_results, recommend
+    from preference_store import JsonPreferenceStore
+
+    df = load_properties(paths["outfile"])
+    prefs = AgentPreferences("bench", store=JsonPreferenceStore(paths["prefs_json"]))
+    modes = {"learned": None, "roi": {"w_roi": 1.0}, "price": {"w_budget": 1.0}}
+
+    result = {}
+    for name, (budget, city, ptype) in _queries(df).items():
+        for mode, weights in modes.items():
+            samples = []
+            for _ in range(options["repeats"]):
+                invalidate_results(df)
+                t = time.perf_counter()
+                results = recommend(df, budget, city, ptype, prefs, weights)
+                results[:options["page_size"]]
+                samples.append(time.perf_counter() - t)
+
+            result[f"{name}/{mode}"] = {
+                "matches": len(results),
+                "selectivity": round(len(results) / max(len(df), 1), 6),
+                **_latency(samples),
+            }
+    return result
+
+
+def bench_save(paths, options):
+    from agent import AgentPreferences
+    from preference_store import SqlitePreferenceStore
+
+    store = SqlitePreferenceStore(paths["prefs_db"])
+    prefs = AgentPreferences("bench", store=store)
+    prop = {"roi": 0.16, "risk_text": "Low Risk", "price": 3_000_000}
+
+    saves, choices = [], []
+    for _ in range(options["repeats"]):
+        t = time.perf_counter()
+        prefs.save()
+        saves.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        prefs.update_from_choice(prop, 3_000_000)
+        choices.append(time.perf_counter() - t)
+    store.close()
+    return {"save": _latency(saves), "update_from_choice": _latency(choices)}
+
+
+STAGES = {
+    "generate": bench_generate,
+    "clean": bench_clean,
+    "features": bench_features,
+    "load": bench_load,
+    "recommend": bench_recommend,
+    "save": bench_save,
+}
+
+
+def _run_stage(name, paths, options):
+    with redirect_stdout(io.StringIO()):
+        result = STAGES[name](paths, options)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def run_size(rows, workdir, stages, options):
+    paths = {
+        "raw": os.path.join(workdir, f"raw_{rows}.csv"),
+        "cleaned": os.path.join(workdir, f"cleaned_{rows}.csv"),
+        "outfile": os.path.join(workdir, f"properties_{rows}.xlsx"),
+        "prefs_json": os.path.join(workdir, "learning.json"),
+        "prefs_db": os.path.join(workdir, f"learning_{rows}.db"),
+    }
+    options = dict(options, rows=rows)
+
+    # Each stage runs in a fresh interpreter so its peak RSS is its own.
+    results = {}
+    for name in stages:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            results[name] = pool.submit(_run_stage, name, paths, options).result()
+        print(f"{rows:>12,} rows  {name:10s} {_summary(results[name])}")
+    return results
+
+
+def _summary(result):
+    if "rows_per_s" in result:
+        return f"{result['seconds']:9.3f}s  {result['rows_per_s']:>14,.0f} rows/s  peak {result['peak_rss_mb']} MB"
+    timed = {k: v for k, v in result.items() if isinstance(v, dict)}
+    p50 = max(v["p50_ms"] for v in timed.values())
+    return f"{len(timed)} cases, worst p50 {p50:.3f} ms  peak {result['peak_rss_mb']} MB"
+
+
+def compare(baseline, current):
+    # Ratio of current to baseline for every timing both files share.
+    def walk(a, b, prefix):
+        for key, value in b.items():
+            if key not in a:
+                continue
+            if isinstance(value, dict):
+                yield from walk(a[key], value, f"{prefix}{key}/")
+            elif key in ("seconds", "p50_ms", "p95_ms", "peak_rss_mb") and a[key] and value is not None:
+                yield f"{prefix}{key}", a[key], value
+
+    for name, old, new in walk(baseline["runs"], current["runs"], ""):
+        print(f"{name:60s} {old:>12,.4f} -> {new:>12,.4f}  x{new / old:6.2f}")
+
+
+def main(rows=(10_000,), stages=tuple(STAGES), out=RESULTS, seed=0, repeats=20, workers=1,
+         workdir=None, baseline=None, max_memory_mb=1024):
+    keep = workdir is not None
+    workdir = workdir or tempfile.mkdtemp(prefix="realestate_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    options = {"seed": seed, "repeats": repeats, "workers": workers, "page_size": 3,
+               "max_memory_mb": max_memory_mb}
+
+    report = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            **options,
+        },
+        "runs": {},
+    }
+    try:
+        for n in rows:
+            report["runs"][str(n)] = run_size(n, workdir, stages, options)
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {out}")
+
+    if baseline:
+        with open(baseline) as f:
+            compare(json.load(f), report)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time every stage on seeded synthetic listings.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000],
+                        help="dataset sizes to run, e.g. 10000 1000000 10000000")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="later stages read the files earlier ones wrote")
+    parser.add_argument("--out", default=RESULTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=20, help="timed calls per latency case")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-memory-mb", type=float, default=1024,
+                        help=f"memory ceiling for the clean stage above {STREAM_ROWS:,} rows")
+    parser.add_argument("--workdir", default=None, help="keep generated files here instead of a temp dir")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(**vars(parse_args()))
@@ -1,10 +1,50 @@
+import argparse
+import os
 import re
+import time
+from functools import partial
+
 import numpy as np
 import pandas as pd
 
+import metrics
+from dedup import TextSignatures, find_duplicates
+from parallel import map_partitions, ordered_map
+from quantile_sketch import GroupedSketches
+
 RAW_CSV = "egypt_real_estate_listings.csv"  
 OUT_CSV = "cleaned_listings.csv" 
 
+# Peak memory while cleaning a chunk is a few times the chunk's raw
+# in-memory size (new columns, regex temporaries, the location split).
+WORKING_SET_FACTOR = 4
+
+# Price-per-sqm outliers, judged per (governorate, property type) on the log
+# scale: outside [Q1 - k*IQR, Q3 + k*IQR] with k = OUTLIER_FENCE. Groups with
+# fewer than OUTLIER_MIN_ROWS sized listings use the fences of all listings,
+# and the IQR never counts as narrower than OUTLIER_MIN_SPREAD (a ratio).
+OUTLIER_GROUP = ("governorate", "property_type")
+OUTLIER_FENCE = 3.0
+OUTLIER_MIN_ROWS = 30
+OUTLIER_MIN_SPREAD = 1.5
+OUTLIER_REPORT = "outlier_report.csv"
+
+# Reposted listings: rows in the same DEDUP_BLOCK with DEDUP_ROOMS equal,
+# prices within DEDUP_PRICE_TOL, sizes within DEDUP_SIZE_TOL (or both
+# missing), no two different DEDUP_DETAIL dates and project/neighbourhood
+# text at least DEDUP_JACCARD similar (MinHash over character shingles)
+# are one unit. Each cluster keeps the row with the most DEDUP_FIELDS
+# filled in, the earliest on ties.
+DEDUP_BLOCK = ("governorate", "city_area", "property_type")
+DEDUP_ROOMS = ("bedrooms_clean", "bathrooms_clean")
+DEDUP_DETAIL = "available_from_date"
+DEDUP_TEXT = ("project_name", "neighbourhood")
+DEDUP_FIELDS = ("size_sqm", "bedrooms_clean", "bathrooms_clean", "down_payment_egp", "available_from_date",
+                "project_name", "neighbourhood")
+DEDUP_PRICE_TOL = 0.02
+DEDUP_SIZE_TOL = 0.01
+DEDUP_JACCARD = 0.6
+
 
 def parse_egp_amount(value):
 
@@ -95,6 +135,73 @@ def parse_bathrooms(bath_str):
         return np.nan
 
 
+# Column-wide versions of the parsers above. They return the same values
+# as mapping the per-cell functions over a column, but parse each distinct
+# raw string once (scraped columns repeat heavily) and run the regexes
+# through pandas' vectorized string methods.
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+
+
+def _distinct_text(col):
+    # str() of every distinct present value, plus a trailing missing entry
+    # that code -1 (a missing cell) maps to.
+    codes, uniques = pd.factorize(col)
+    distinct = pd.Series(list(uniques) + [np.nan], dtype=object)
+    return codes, distinct.astype(str).where(distinct.notna())
+
+
+def _spread(values, codes, col):
+    return pd.Series(values.to_numpy()[codes], index=col.index)
+
+
+def _as_int(values):
+    # Integer column when nothing is missing, float with NaN otherwise,
+    # matching how pandas infers a column of ints and NaNs.
+    if values.isna().any():
+        return values.astype(float)
+    return values.astype(np.int64)
+
+
+def parse_egp_amount_column(col):
+    codes, text = _distinct_text(col)
+    text = text.str.replace(",", "", regex=False)
+    amount = text.str.extract(_NUMBER, expand=False).astype(float)
+    return _spread(amount, codes, col)
+
+
+def parse_size_column(col):
+    codes, text = _distinct_text(col)
+    text = text.str.lower()
+
+    sqft = text.str.extract(_NUMBER + r"\s*sqft", expand=False).astype(float)
+    sqm = text.str.extract(_NUMBER + r"\s*sqm", expand=False).astype(float)
+    sqm = sqm.fillna(sqft * 0.092903)
+
+    return _spread(sqft, codes, col), _spread(sqm, codes, col)
+
+
+def parse_bedrooms_column(col):
+    codes, text = _distinct_text(col)
+    text = text.str.strip().str.lower()
+
+    has_maid = text.str.contains("maid", regex=False).fillna(False).astype(bool)
+    studio = text.str.contains("studio", regex=False).fillna(False).astype(bool)
+    beds = text.str.extract(r"(\d+)", expand=False).astype(float).mask(studio, 0)
+
+    return _as_int(_spread(beds, codes, col)), _spread(has_maid, codes, col)
+
+
+def parse_bathrooms_column(col):
+    codes, text = _distinct_text(col)
+    text = text.str.strip().str.lower()
+
+    baths = text.str.replace("+", "", regex=False).str.extract(_NUMBER, expand=False).astype(float)
+    baths = np.round(baths).mask(text == "none", 0)
+
+    return _as_int(_spread(baths, codes, col))
+
+
 def parse_available_date(date_str):
    
     if pd.isna(date_str):
@@ -153,49 +260,288 @@ def normalize_property_type(t):
 
 
 
-def main():
-    print(f"Loading raw data from: {RAW_CSV!r}")
-    df = pd.read_csv(RAW_CSV)
+def _quiet(msg):
+    pass
+
 
-    print("Cleaning price and down_payment...")
-    df["price_egp"] = df["price"].apply(parse_egp_amount)
-    df["down_payment_egp"] = df["down_payment"].apply(parse_egp_amount)
+def clean_frame(df, log=print):
+    metrics.count("clean.rows_in", len(df))
 
-    print("Parsing size...")
-    size_parsed = df["size"].apply(parse_size)
-    df["size_sqft"] = size_parsed.apply(lambda x: x[0])
-    df["size_sqm"] = size_parsed.apply(lambda x: x[1])
+    log("Cleaning price and down_payment...")
+    with metrics.span("clean.price"):
+        df["price_egp"] = parse_egp_amount_column(df["price"])
+        df["down_payment_egp"] = parse_egp_amount_column(df["down_payment"])
 
-    print("Cleaning bedrooms...")
-    bed_parsed = df["bedrooms"].apply(parse_bedrooms)
-    df["bedrooms_clean"] = bed_parsed.apply(lambda x: x[0])
-    df["has_maid_room"] = bed_parsed.apply(lambda x: x[1])
+    log("Parsing size...")
+    with metrics.span("clean.size"):
+        df["size_sqft"], df["size_sqm"] = parse_size_column(df["size"])
 
-    print("Cleaning bathrooms...")
-    df["bathrooms_clean"] = df["bathrooms"].apply(parse_bathrooms)
+    log("Cleaning bedrooms...")
+    with metrics.span("clean.bedrooms"):
+        df["bedrooms_clean"], df["has_maid_room"] = parse_bedrooms_column(df["bedrooms"])
 
-    print("Parsing available_from dates...")
-    df["available_from_date"] = df["available_from"].apply(parse_available_date)
+    log("Cleaning bathrooms...")
+    with metrics.span("clean.bathrooms"):
+        df["bathrooms_clean"] = parse_bathrooms_column(df["bathrooms"])
 
-    print("Splitting location into components...")
-    loc_cols = df["location"].apply(split_location)
-    loc_cols.columns = ["project_name", "neighbourhood", "city_area", "governorate"]
-    df = pd.concat([df, loc_cols], axis=1)
+    log("Parsing available_from dates...")
+    with metrics.span("clean.dates"):
+        df["available_from_date"] = df["available_from"].apply(parse_available_date)
 
-    print("Normalizing property type...")
-    df["property_type"] = df["type"].apply(normalize_property_type)
+    log("Splitting location into components...")
+    with metrics.span("clean.location"):
+        loc_cols = df["location"].apply(split_location)
+        loc_cols.columns = ["project_name", "neighbourhood", "city_area", "governorate"]
+        df = pd.concat([df, loc_cols], axis=1)
 
-    print("Dropping rows with missing essential values...")
+    log("Normalizing property type...")
+    with metrics.span("clean.type"):
+        df["property_type"] = df["type"].apply(normalize_property_type)
+
+    log("Dropping rows with missing essential values...")
     before = len(df)
     df = df.dropna(subset=["price_egp", "city_area", "governorate"])
     after = len(df)
-    print(f"Dropped {before - after} rows with missing price or location.")
+    log(f"Dropped {before - after} rows with missing price or location.")
+    metrics.count("clean.rows_dropped", before - after)
+
+    return df
+
+
+def _outlier_groups(df):
+    # Missing keys read as "" both here and when the CSV is re-read as text.
+    keys = pd.MultiIndex.from_arrays([df[c].fillna("").astype(str).str.strip().str.lower() for c in OUTLIER_GROUP])
+    return pd.factorize(keys)
+
+def price_per_sqm(df):
+    price = pd.to_numeric(df["price_egp"], errors="coerce")
+    size = pd.to_numeric(df["size_sqm"], errors="coerce")
+    return (price / size.where(size > 0)).to_numpy(dtype=float)
+
+def outlier_sketches(df):
+    codes, keys = _outlier_groups(df)
+    return GroupedSketches().add(codes, keys, price_per_sqm(df))
+
+def outlier_fences(sketches):
+    # {group: (low, high, source)}; "*" holds the fences of all listings.
+    def fences(sketch):
+        q1, q3 = np.log(sketch.quantile(0.25)), np.log(sketch.quantile(0.75))
+        spread = max(q3 - q1, np.log(OUTLIER_MIN_SPREAD))
+        return float(np.exp(q1 - OUTLIER_FENCE * spread)), float(np.exp(q3 + OUTLIER_FENCE * spread))
+
+    overall = sketches.combined()
+    out = {"*": (*fences(overall), "all") if overall.count else (0.0, np.inf, "all")}
+    for key, sketch in sketches.groups.items():
+        out[key] = (*fences(sketch), "group") if sketch.count >= OUTLIER_MIN_ROWS else out["*"]
+    return out
+
+def flag_outliers(df, fences):
+    # Boolean is_outlier per row, plus outlier counts per group. Rows
+    # without a usable size are never flagged.
+    codes, keys = _outlier_groups(df)
+    lows = np.array([fences.get(k, fences["*"])[0] for k in keys] + [0.0])
+    highs = np.array([fences.get(k, fences["*"])[1] for k in keys] + [np.inf])
+    value = price_per_sqm(df)
+    flagged = np.isfinite(value) & ((value < lows[codes]) | (value > highs[codes]))
+    counts = np.bincount(codes[flagged], minlength=len(keys))
+    return flagged, {keys[i]: int(n) for i, n in enumerate(counts) if n}
+
+def write_outlier_report(path, sketches, fences, flagged):
+    rows = []
+    for key, sketch in sorted(sketches.groups.items()):
+        low, high, source = fences[key]
+        rows.append({
+            **dict(zip(OUTLIER_GROUP, key)), "sized_rows": sketch.count,
+            "p25_per_sqm": sketch.quantile(0.25), "median_per_sqm": sketch.quantile(0.5),
+            "p75_per_sqm": sketch.quantile(0.75), "low_fence": low, "high_fence": high,
+            "fence_from": source, "outliers": flagged.get(key, 0),
+        })
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return sum(flagged.values())
+
+def dedup_keys(df, signatures):
+    # Compact per-row inputs for find_duplicates. Text keys are normalized
+    # the same way whether df is freshly cleaned or the CSV re-read as text.
+    def text(c):
+        return df[c].fillna("").astype(str).str.strip().str.lower()
+
+    # One dtype for the room counts, whatever a chunk parsed them as, so
+    # equal keys hash equally in every chunk.
+    rooms = {c: pd.to_numeric(df[c], errors="coerce").fillna(-1).astype("float64") for c in DEDUP_ROOMS}
+    keys = pd.DataFrame({**{c: text(c) for c in DEDUP_BLOCK}, **rooms})
+    block = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    price = pd.to_numeric(df["price_egp"], errors="coerce").to_numpy(dtype=float)
+    size = pd.to_numeric(df["size_sqm"], errors="coerce").to_numpy(dtype=float)
+    texts = signatures.add(text(DEDUP_TEXT[0]).str.cat([text(c) for c in DEDUP_TEXT[1:]], sep=" "))
+    dates = pd.to_datetime(df[DEDUP_DETAIL], errors="coerce", format="ISO8601")
+    detail = ((dates - pd.Timestamp(0)) // pd.Timedelta(days=1)).to_numpy(dtype=float)
+    score = sum((df[c].notna() & (df[c].astype(str) != "")).to_numpy(dtype=np.int8) for c in DEDUP_FIELDS)
+    return block, price, size, texts, detail, score
+
+def _duplicates(parts, signatures):
+    keys = [np.concatenate(k) for k in zip(*parts)]
+    return find_duplicates(*keys, signatures.matrix(), DEDUP_PRICE_TOL, DEDUP_SIZE_TOL, DEDUP_JACCARD)
+
+def duplicate_rows(df):
+    signatures = TextSignatures()
+    return _duplicates([dedup_keys(df, signatures)], signatures)
+
+def _dedup_file(out_csv, chunksize):
+    # Streaming: collect the compact keys of every cleaned row, a chunk at
+    # a time, and return which rows to drop.
+    signatures = TextSignatures()
+    columns = sorted({*DEDUP_BLOCK, *DEDUP_ROOMS, *DEDUP_TEXT, *DEDUP_FIELDS, DEDUP_DETAIL, "price_egp"})
+    parts = [dedup_keys(chunk, signatures) for chunk in
+             pd.read_csv(out_csv, chunksize=chunksize, usecols=columns, dtype=str, keep_default_na=False)]
+    return _duplicates(parts, signatures) if parts else np.zeros(0, dtype=bool)
+
+def report_path(out_csv, report_csv=None):
+    return report_csv or os.path.join(os.path.dirname(out_csv), OUTLIER_REPORT)
+
+def _flag_file(out_csv, fences, chunksize, drop=None):
+    # Last streaming pass: drop duplicate rows and add is_outlier to the
+    # cleaned CSV chunk by chunk. Columns are read and written back as text
+    # so nothing else in the file changes.
+    tmp = out_csv + ".tmp"
+    flagged = {}
+    start = 0
+    for i, chunk in enumerate(pd.read_csv(out_csv, chunksize=chunksize, dtype=str, keep_default_na=False)):
+        if drop is not None:
+            start, rows = start + len(chunk), drop[start:start + len(chunk)]
+            chunk = chunk[~rows]
+        chunk["is_outlier"], counts = flag_outliers(chunk, fences)
+        for key, n in counts.items():
+            flagged[key] = flagged.get(key, 0) + n
+        chunk.to_csv(tmp, index=False, mode="w" if i == 0 else "a", header=i == 0)
+    os.replace(tmp, out_csv)
+    return flagged
+
+
+def dedup_and_flag(df, report_csv, dedup=True, log=print):
+    # Whole-frame ending of a clean: drop duplicate listings, add is_outlier
+    # and write the outlier report (when report_csv is given). The fences are sketched before dedup, as
+    # the streaming path does from its first pass.
+    sketches = outlier_sketches(df)
+    if dedup:
+        log("Finding duplicate listings...")
+        with metrics.span("clean.dedup"):
+            drop = duplicate_rows(df)
+            df = df[~drop]
+        log(f"Dropped {int(drop.sum()):,} duplicate listings.")
+        metrics.count("clean.duplicates", int(drop.sum()))
+
+    log("Flagging price-per-sqm outliers...")
+    with metrics.span("clean.outliers"):
+        fences = outlier_fences(sketches)
+        df["is_outlier"], flagged = flag_outliers(df, fences)
+        if report_csv:
+            n_outliers = write_outlier_report(report_csv, sketches, fences, flagged)
+        else:
+            n_outliers = sum(flagged.values())
+    log(f"Flagged {n_outliers:,} price-per-sqm outliers.")
+    return df
+
+
+def chunk_rows_for_memory(raw_csv, max_memory_mb, sample_rows=1000):
+    sample = pd.read_csv(raw_csv, nrows=sample_rows)
+    if sample.empty:
+        return sample_rows
+    row_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(100, int(max_memory_mb * 2**20 / (row_bytes * WORKING_SET_FACTOR)))
+
+
+def _clean_chunk(chunk):
+    cleaned = clean_frame(chunk, log=_quiet)
+    return len(chunk), cleaned, outlier_sketches(cleaned)
+
+
+def stream_clean(raw_csv=RAW_CSV, out_csv=OUT_CSV, chunksize=None, max_memory_mb=256, workers=1,
+                 report_csv=None, dedup=True):
+    if chunksize is None:
+        # Every worker holds a chunk of its own.
+        chunksize = chunk_rows_for_memory(raw_csv, max_memory_mb / max(workers, 1))
+    print(f"Streaming {raw_csv!r} in chunks of {chunksize:,} rows...")
+
+    rows_in = rows_out = duplicates = 0
+    sketches = GroupedSketches()
+    started = t0 = time.perf_counter()
+    chunks = pd.read_csv(raw_csv, chunksize=chunksize)
+    for i, (n_in, cleaned, chunk_sketches) in enumerate(ordered_map(_clean_chunk, chunks, workers, window=workers)):
+        cleaned.to_csv(out_csv, index=False, mode="w" if i == 0 else "a", header=i == 0)
+        sketches.merge(chunk_sketches)
+        elapsed, t0 = time.perf_counter() - t0, time.perf_counter()
+
+        rows_in += n_in
+        rows_out += len(cleaned)
+        print(
+            f"Chunk {i + 1}: {n_in:,} rows in, {n_in - len(cleaned):,} dropped, "
+            f"{n_in / max(elapsed, 1e-9):,.0f} rows/s"
+        )
+
+    drop = None
+    if dedup:
+        print("Finding duplicate listings...")
+        with metrics.span("clean.dedup"):
+            drop = _dedup_file(out_csv, chunksize)
+        duplicates = int(drop.sum())
+        print(f"Dropped {duplicates:,} duplicate listings.")
+        metrics.count("clean.duplicates", duplicates)
+
+    print("Flagging price-per-sqm outliers...")
+    with metrics.span("clean.outliers"):
+        fences = outlier_fences(sketches)
+        flagged = _flag_file(out_csv, fences, chunksize, drop)
+        n_outliers = write_outlier_report(report_path(out_csv, report_csv), sketches, fences, flagged)
+    print(f"Flagged {n_outliers:,} price-per-sqm outliers.")
+
+    total = time.perf_counter() - started
+    print(f"Dropped {rows_in - rows_out} rows with missing price or location.")
+    print(f"Done: {rows_in:,} rows in, {rows_out - duplicates:,} written in {total:.1f}s "
+          f"({rows_in / max(total, 1e-9):,.0f} rows/s).")
+    return rows_out - duplicates
+
+
+def main(raw_csv=RAW_CSV, out_csv=OUT_CSV, chunksize=None, max_memory_mb=None, workers=1, report_csv=None,
+         dedup=True):
+    if chunksize or max_memory_mb:
+        return stream_clean(raw_csv, out_csv, chunksize, max_memory_mb or 256, workers, report_csv, dedup)
+
+    print(f"Loading raw data from: {raw_csv!r}")
+    df = pd.read_csv(raw_csv)
+
+    if workers > 1:
+        print(f"Cleaning {len(df):,} rows on {workers} workers...")
+        before = len(df)
+        df = map_partitions(partial(clean_frame, log=_quiet), df, workers)
+        print(f"Dropped {before - len(df)} rows with missing price or location.")
+    else:
+        df = clean_frame(df)
+
+    df = dedup_and_flag(df, report_path(out_csv, report_csv), dedup)
 
-    print(f"Saving cleaned data to: {OUT_CSV!r}")
-    df.to_csv(OUT_CSV, index=False)
+    print(f"Saving cleaned data to: {out_csv!r}")
+    df.to_csv(out_csv, index=False)
     print("Done.")
     print("Final shape:", df.shape)
+    return len(df)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the raw real estate listings CSV.")
+    parser.add_argument("--raw-csv", default=RAW_CSV)
+    parser.add_argument("--out-csv", default=OUT_CSV)
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the raw CSV in chunks of this many rows")
+    parser.add_argument("--max-memory-mb", type=float, default=None,
+                        help="stream the raw CSV, sizing chunks to stay under this memory ceiling")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="clean row ranges in this many worker processes")
+    parser.add_argument("--report-csv", default=None,
+                        help=f"price-per-sqm outlier report (default: {OUTLIER_REPORT} next to --out-csv)")
+    parser.add_argument("--keep-duplicates", dest="dedup", action="store_false",
+                        help="skip dropping reposted listings")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    main(**vars(parse_args()))
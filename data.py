@@ -1,9 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
 import pandas as pd
 
+from model import RETURN_COLUMNS, build_index, get_index
+from packed_strings import PackedStringArray, PackedStringDtype
+from similar import build_similar
+
 REQUIRED = {"name","city","property_type","price","expected_roi","base_risk","url"}
 
-def load_properties(path="properties.xlsx"):
-    df = pd.read_excel(path)
+# Low-cardinality text kept as categoricals once loaded: each distinct
+# string is stored once and rows hold small integer codes. Urls are nearly
+# unique, so they are packed into one byte buffer instead (packed_strings.py).
+CATEGORICAL = ("name", "city", "property_type")
+PACKED = ("url",)
+
+def snapshot_path(path):
+    return os.path.splitext(path)[0] + ".snapshot"
+
+def write_snapshot(df, path="properties.xlsx"):
+    # Typed columnar copy of the dataset: one .npy per numeric column,
+    # codes + categories for text and, for text that is mostly distinct, a
+    # byte buffer + starts + lengths, so loading skips openpyxl entirely.
+    out = snapshot_path(path)
+    tmp = out + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    digest = hashlib.sha256()
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        entry = {"name": str(name), "file": f"c{i}.npy"}
+        if pd.api.types.is_numeric_dtype(col.dtype) and isinstance(col.dtype, np.dtype):
+            parts = [col.to_numpy()]
+            entry["kind"] = "numeric"
+        elif isinstance(col.dtype, PackedStringDtype) or name in PACKED:
+            packed = col.array if isinstance(col.dtype, PackedStringDtype) else PackedStringArray.from_strings(col)
+            parts = [packed.buffer, packed.starts, packed.lengths]
+            entry["kind"] = "packed"
+            entry["prefix"] = packed.prefix
+        else:
+            codes, uniques = pd.factorize(col)
+            parts = [codes.astype(np.int32)]
+            entry["kind"] = "text"
+            entry["categories"] = uniques.tolist()
+        entry["files"] = [f"c{i}_{j}.npy" if j else entry["file"] for j in range(len(parts))]
+        digest.update(entry["name"].encode())
+        for file, values in zip(entry["files"], parts):
+            np.save(os.path.join(tmp, file), values)
+            digest.update(np.ascontiguousarray(values).tobytes())
+        columns.append(entry)
+
+    meta = {"rows": len(df), "columns": columns, "sha256": digest.hexdigest()}
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, default=str)
+
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return meta["sha256"]
+
+def read_snapshot(path="properties.xlsx", verify=False, categorical=()):
+    src = snapshot_path(path)
+    with open(os.path.join(src, "meta.json")) as f:
+        meta = json.load(f)
+
+    digest = hashlib.sha256()
+    data = {}
+    for entry in meta["columns"]:
+        parts = [np.load(os.path.join(src, f), mmap_mode="r") for f in entry.get("files", [entry["file"]])]
+        if verify:
+            digest.update(entry["name"].encode())
+            for values in parts:
+                digest.update(values.tobytes())
+        values = parts[0]
+        if entry["kind"] == "packed":
+            values = pd.array(PackedStringArray(entry["prefix"], *parts), dtype=PackedStringDtype())
+        elif entry["kind"] == "text" and entry["name"] in categorical:
+            values = pd.Categorical.from_codes(values, pd.Index(entry["categories"], dtype=object))
+        elif entry["kind"] == "text":
+            categories = np.array(entry["categories"] + [np.nan], dtype=object)
+            values = categories[values]
+        data[entry["name"]] = values
+
+    if verify and digest.hexdigest() != meta["sha256"]:
+        raise ValueError("Snapshot content hash mismatch")
+    return pd.DataFrame(data, copy=False)
+
+def _snapshot_is_fresh(path):
+    meta = os.path.join(snapshot_path(path), "meta.json")
+    if not os.path.exists(meta):
+        return False
+    if not os.path.exists(path):
+        return True
+    return os.path.getmtime(meta) >= os.path.getmtime(path)
+
+def read_properties(path="properties.xlsx", use_snapshot=True, categorical=()):
+    if use_snapshot and _snapshot_is_fresh(path):
+        return read_snapshot(path, categorical=categorical)
+    return pd.read_excel(path)
+
+def compact_properties(df):
+    # Categorical text, packed urls, int8 risk (float32 if any risk is
+    # missing) and float32 ROI, size, bedrooms and simulated returns. Price
+    # stays float64: listings run past 2**24 EGP.
+    out = {}
+    for name in df.columns:
+        col = df[name]
+        if name in CATEGORICAL and not isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.astype("category")
+        elif name in PACKED and not isinstance(col.dtype, PackedStringDtype):
+            col = pd.Series(PackedStringArray.from_strings(col), index=col.index, name=name)
+        elif name == "base_risk":
+            col = pd.to_numeric(col, errors="coerce")
+            col = col.astype(np.float32 if col.isna().any() else np.int8)
+        elif name in ("expected_roi", "size_sqm", "bedrooms") or name in RETURN_COLUMNS:
+            col = pd.to_numeric(col, errors="coerce").astype(np.float32)
+        out[name] = col
+    return pd.DataFrame(out, copy=False)
+
+def column_choices(df, column):
+    # Sorted distinct values for a dropdown, read off the categories when
+    # the column is categorical.
+    col = df[column]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        values = col.cat.categories
+    else:
+        values = col.dropna().unique()
+    return sorted(set(str(v) for v in values))
+
+def memory_report(df):
+    # Bytes per column (strings counted once per category) plus the ranking
+    # index, largest first.
+    usage = {name: int(df[name].memory_usage(index=False, deep=True)) for name in df.columns}
+    index = get_index(df)
+    usage["(ranking index)"] = index.nbytes()
+    if index.similar is not None:
+        usage["(similar index)"] = index.similar.nbytes()
+    return pd.Series(usage, name="bytes").sort_values(ascending=False)
+
+def load_properties(path="properties.xlsx", use_snapshot=True, include_outliers=False):
+    df = read_properties(path, use_snapshot, categorical=CATEGORICAL)
     if not REQUIRED.issubset(df.columns):
         raise ValueError("Dataset missing required columns")
+    df = compact_properties(df)
+    build_index(df, include_outliers)
+    build_similar(df)
     return df
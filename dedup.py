@@ -0,0 +1,158 @@
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Near-duplicate detection that never compares all pairs. Rows only meet
+# when they share a block key, a price bucket (two bucket grids offset by
+# half a bucket, so two prices within the tolerance share a bucket in at
+# least one of them) and one LSH band of the MinHash signature of their
+# text. Inside such a group rows are sorted by size and each is compared
+# with every later row whose size is still within tolerance, up to WINDOW
+# rows on, so copies are found however many other rows sort between them
+# and every pass stays one sort plus a bounded scan.
+SHINGLE = 3  # characters per shingle
+NUM_PERM = 32  # MinHash permutations
+BANDS = 8  # LSH bands of NUM_PERM // BANDS values each
+WINDOW = 32  # most rows on that a row is compared with in one pass
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.int64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.int64)
+
+
+def normalize_text(text):
+    return re.sub(r"[^0-9a-z]+", " ", str(text).lower()).strip()
+
+
+def minhash(text):
+    # Signature of the text's character shingles; all _PRIME when empty.
+    if not text:
+        return np.full(NUM_PERM, _PRIME, dtype=np.int64)
+    padded = f" {text} "
+    shingles = {padded[i:i + SHINGLE] for i in range(len(padded) - SHINGLE + 1)}
+    x = np.fromiter((zlib.crc32(s.encode()) % _PRIME for s in shingles), dtype=np.int64, count=len(shingles))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+class TextSignatures:
+    # One signature per distinct normalized text, with ids that stay fixed
+    # while texts from later chunks are added.
+    def __init__(self):
+        self.ids = {}
+        self.rows = []
+
+    def add(self, texts):
+        codes, uniques = pd.factorize(pd.Series(texts, dtype=object))
+        ids = np.empty(len(uniques), dtype=np.int32)
+        for i, text in enumerate(uniques):
+            key = normalize_text(text)
+            if key not in self.ids:
+                self.ids[key] = len(self.rows)
+                self.rows.append(minhash(key))
+            ids[i] = self.ids[key]
+        return ids[codes]
+
+    def matrix(self):
+        if not self.rows:
+            return np.empty((0, NUM_PERM), dtype=np.int64)
+        return np.vstack(self.rows)
+
+
+def similarity(signatures, a, b):
+    # Estimated Jaccard similarity of text ids a[i] and b[i]; 0 when either
+    # text is empty, since there is nothing to match on.
+    sa, sb = signatures[a], signatures[b]
+    estimate = (sa == sb).mean(axis=1)
+    return np.where((sa[:, 0] == _PRIME) | (sb[:, 0] == _PRIME), 0.0, estimate)
+
+
+def _bands(signatures):
+    # Per band, a code per text id; equal codes mean an identical band.
+    width = NUM_PERM // BANDS
+    return [np.unique(signatures[:, j * width:(j + 1) * width], axis=0, return_inverse=True)[1].ravel()
+            for j in range(BANDS)]
+
+
+def _components(label, a, b):
+    # Joins the components in label (every row pointing at its root) along
+    # the pairs a[i]-b[i]: hook the higher root of every unsettled pair onto
+    # the lower one, then flatten, until all pairs agree. Each row ends
+    # labelled with the first row of its component.
+    while True:
+        la, lb = label[a], label[b]
+        open_ = la != lb
+        if not open_.any():
+            return label
+        a, b, la, lb = a[open_], b[open_], la[open_], lb[open_]
+        np.minimum.at(label, np.maximum(la, lb), np.minimum(la, lb))
+        while True:
+            up = label[label]
+            if np.array_equal(up, label):
+                break
+            label = up
+
+
+def find_duplicates(block, price, size, text, detail, score, signatures, price_tol, size_tol, threshold):
+    # Rows to drop: every member of a duplicate cluster except its highest
+    # scoring row (the earliest one among equals). Two rows are duplicates
+    # when they share a block, their prices and their sizes differ by at
+    # most price_tol and size_tol (sizes may also both be missing), their
+    # details do not differ (NaN matches anything) and their text
+    # similarity is at least threshold; clusters are the connected
+    # components of that relation.
+    n = len(block)
+    if not n:
+        return np.zeros(0, dtype=bool)
+    bands = _bands(signatures)
+    # Buckets a little over twice the widest log gap allowed between prices.
+    step = np.log(np.maximum(price, 1e-9)) / (-2.02 * np.log1p(-price_tol))
+    size_key = np.nan_to_num(size, nan=-1.0)
+    sized = np.isfinite(size)
+    known = np.isfinite(detail)
+
+    def close(a, b, values, tol):
+        return np.abs(values[a] - values[b]) <= tol * np.fmax(values[a], values[b])
+
+    # Rows presorted by size, text and price; each pass then only has to
+    # (stably) group them by a hash of its key, leaving every group sorted
+    # by size. Hash collisions just add rows that the checks below turn away.
+    presorted = np.lexsort((price, text, size_key))
+    block = np.asarray(block).astype(np.uint64)
+
+    # Pairs are merged into the components after every step, so only one
+    # step's pairs are held at a time.
+    label = np.arange(n)
+    for offset in (0.0, 0.5):
+        bucket = np.floor(step + offset).astype(np.int64)
+        for band in bands:
+            code = band[text]
+            group = block ^ (bucket.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) ^ \
+                (code.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F))
+            order = presorted[np.argsort(group[presorted], kind="stable")]
+
+            # Positions in order whose row may still pair with the row lag
+            # places on: same group and, sizes being sorted, a size close
+            # enough (or both missing). Once that fails it fails for every
+            # later row too.
+            live = np.arange(n)
+            for lag in range(1, WINDOW + 1):
+                live = live[live + lag < n]
+                a, b = order[live], order[live + lag]
+                near = (group[a] == group[b]) & (~sized[a] & ~sized[b] | close(a, b, size, size_tol))
+                live, a, b = live[near], a[near], b[near]
+                if not len(live):
+                    break
+                same = (block[a] == block[b]) & (bucket[a] == bucket[b]) & (code[a] == code[b]) & \
+                    close(a, b, price, price_tol) & ~(known[a] & known[b] & (detail[a] != detail[b]))
+                a, b = a[same], b[same]
+                similar = similarity(signatures, text[a], text[b]) >= threshold
+                label = _components(label, a[similar], b[similar])
+
+    order = np.lexsort((np.arange(n), -np.asarray(score), label))
+    drop = np.ones(n, dtype=bool)
+    first = np.r_[True, label[order][1:] != label[order][:-1]]
+    drop[order[first]] = False
+    return drop
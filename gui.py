@@ -1,12 +1,19 @@
+import queue
+import time
 import tkinter as tk
-from tkinter import scrolledtext, ttk
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, scrolledtext, ttk
 import webbrowser
 
-from model import recommend
+import metrics
+from data import column_choices
+from model import invalidate_results, recommend
+from similar import similar_listings
 
 
 class ChatGPTStyleApp:
-    def __init__(self, root, df, prefs):
+    def __init__(self, root, df, prefs, max_messages=200):
         self.root, self.df, self.prefs = root, df, prefs
 
         root.title("Real Estate Investment Advisor — ChatGPT Style ✨🏠")
@@ -21,9 +28,37 @@ class ChatGPTStyleApp:
         self.shown_results = []
         self.waiting_for_choice = False
         self.user_budget = None
+        self.last_choice = None
+        self.similar_count = 12
 
         self.override_weights = None
 
+        # Searches run on one background worker; results come back through
+        # a queue polled with root.after, and only the latest search_id is
+        # rendered.
+        self.search_id = 0
+        self.searching = False
+        self.pending_search = None
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self.search_results = queue.Queue()
+        self.search_started = 0.0
+
+        self.metrics_window = None
+
+        # The transcript keeps the last max_messages messages. Each message
+        # starts at a left-gravity mark; links share one "link" tag and are
+        # looked up by absolute line number (line in widget + lines trimmed).
+        self.max_messages = max_messages
+        self.message_marks = deque()
+        self.message_count = 0
+        self.trimmed_lines = 0
+        self.links = OrderedDict()
+        self.root.bind("<F12>", lambda e: self.show_metrics_panel())
+
+        # Ranked results are cached per search; learned weights changing
+        # makes the learned-mode entries stale.
+        self.prefs.add_listener(lambda: invalidate_results(self.df))
+
         self.build_top_filters()
         self.build_chat_area()
         self.build_input_area()
@@ -34,9 +69,12 @@ class ChatGPTStyleApp:
             "If you don't like them, type 9 and I'll show 3 more.\n"
             "When you like one, type its number (1–3).\n"
             "To stop, type 0.\n\n"
-            "Extra commands: type roi / risk / price to prioritize, or reset to go back to normal."
+            "Extra commands: type roi / risk / price to prioritize, or reset to go back to normal.\n"
+            "Type similar after picking one (or similar 1–3) for more listings like it."
         )
 
+        self.root.after(50, self.poll_search_results)
+
     def weights_text(self):
         return (
             f"Learned weights — ROI: {self.prefs.w_roi:.2f}  "
@@ -54,12 +92,12 @@ class ChatGPTStyleApp:
         self.budget_entry = tk.Entry(top, bg="#fbfbfb", fg="#111", relief=tk.GROOVE, bd=1, width=12)
         self.budget_entry.grid(row=0, column=1, padx=(6, 18))
 
-        cities = ["Any"] + sorted(set(str(c) for c in self.df["city"].dropna().unique()))
+        cities = ["Any"] + column_choices(self.df, "city")
         tk.Label(top, text="City:", bg="#ffffff", fg="#333", font=("Segoe UI", 10)).grid(row=0, column=2, sticky="w")
         self.city_var = tk.StringVar(value="Any")
         ttk.OptionMenu(top, self.city_var, cities[0], *cities).grid(row=0, column=3, padx=(6, 18))
 
-        types = ["Any"] + sorted(set(str(t) for t in self.df["property_type"].dropna().unique()))
+        types = ["Any"] + column_choices(self.df, "property_type")
         tk.Label(top, text="Type:", bg="#ffffff", fg="#333", font=("Segoe UI", 10)).grid(row=0, column=4, sticky="w")
         self.type_var = tk.StringVar(value="Any")
         ttk.OptionMenu(top, self.type_var, types[0], *types).grid(row=0, column=5, padx=(6, 18))
@@ -85,6 +123,9 @@ class ChatGPTStyleApp:
         self.chat.pack(fill=tk.BOTH, expand=True)
         self.chat.config(state=tk.DISABLED)
 
+        self.chat.tag_config("link", foreground="blue", underline=True)
+        self.chat.tag_bind("link", "<Button-1>", self.open_link)
+
         self.chat.tag_config("bot_label", foreground="#057a60", font=("Segoe UI", 9, "bold"))
         self.chat.tag_config("user_label", foreground="#6a2fb6", font=("Segoe UI", 9, "bold"))
         self.chat.tag_config(
@@ -118,8 +159,39 @@ class ChatGPTStyleApp:
             side=tk.RIGHT
         )
 
+    def begin_message(self):
+        # Call with the widget in NORMAL state, before inserting a message.
+        mark = f"msg_{self.message_count}"
+        self.message_count += 1
+        self.chat.mark_set(mark, "end-1c")
+        self.chat.mark_gravity(mark, tk.LEFT)
+        self.message_marks.append(mark)
+
+        if len(self.message_marks) <= self.max_messages:
+            return
+        while len(self.message_marks) > self.max_messages:
+            self.chat.mark_unset(self.message_marks.popleft())
+
+        first = self.message_marks[0]
+        self.trimmed_lines += int(self.chat.index(first).split(".")[0]) - 1
+        self.chat.delete("1.0", first)
+        while self.links and next(iter(self.links)) <= self.trimmed_lines:
+            self.links.popitem(last=False)
+
+    def insert_link(self, url, link_text="View property"):
+        line = int(self.chat.index("end-1c").split(".")[0]) + self.trimmed_lines
+        self.links[line] = url
+        self.chat.insert(tk.END, link_text + "\n", ("link",))
+
+    def open_link(self, event):
+        line = int(self.chat.index(f"@{event.x},{event.y}").split(".")[0]) + self.trimmed_lines
+        url = self.links.get(line)
+        if url:
+            webbrowser.open(url)
+
     def bot_send(self, msg):
         self.chat.config(state=tk.NORMAL)
+        self.begin_message()
         self.chat.insert(tk.END, "\nBot:\n", "bot_label")
         self.chat.insert(tk.END, "  " + msg + "\n", "bot_msg")
         self.chat.config(state=tk.DISABLED)
@@ -127,6 +199,7 @@ class ChatGPTStyleApp:
 
     def user_send(self, msg):
         self.chat.config(state=tk.NORMAL)
+        self.begin_message()
         self.chat.insert(tk.END, "\nYou:\n", "user_label")
         self.chat.insert(tk.END, "  " + msg + "\n", "user_msg")
         self.chat.config(state=tk.DISABLED)
@@ -135,11 +208,7 @@ class ChatGPTStyleApp:
     def insert_clickable_link(self, text_before, url, link_text="View property"):
         self.chat.config(state=tk.NORMAL)
         self.chat.insert(tk.END, "  " + text_before, "bot_msg")
-
-        tag = f"link_{self.chat.index(tk.END)}"
-        self.chat.insert(tk.END, link_text + "\n", (tag,))
-        self.chat.tag_config(tag, foreground="blue", underline=True)
-        self.chat.tag_bind(tag, "<Button-1>", lambda e, u=url: webbrowser.open(u))
+        self.insert_link(url, link_text)
 
         self.chat.config(state=tk.DISABLED)
         self.chat.yview(tk.END)
@@ -170,7 +239,57 @@ class ChatGPTStyleApp:
 
         self.bot_send(f"🔎 Searching for {ptype} in {city}{mode} ...")
 
-        self.all_results = recommend(self.df, self.user_budget, city, ptype, self.prefs, self.override_weights)
+        self.search_id += 1
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+
+        self.waiting_for_choice = False
+        self.search_started = time.perf_counter()
+        self.set_searching(True)
+        self.pending_search = self.search_executor.submit(
+            self.run_search, self.search_id, self.user_budget, city, ptype, self.override_weights
+        )
+
+    def run_search(self, search_id, budget, city, ptype, override_weights):
+        # Worker thread: never touch Tk widgets here.
+        if search_id != self.search_id:
+            return
+        try:
+            results = recommend(self.df, budget, city, ptype, self.prefs, override_weights)
+            results[:self.page_size]  # rank and build the first page off the Tk thread
+        except Exception as e:
+            self.search_results.put((search_id, None, e))
+            return
+        self.search_results.put((search_id, results, None))
+
+    def poll_search_results(self):
+        try:
+            while True:
+                search_id, results, error = self.search_results.get_nowait()
+                if search_id != self.search_id:
+                    continue
+                self.set_searching(False)
+                if error is None:
+                    try:
+                        self.show_search_results(results)
+                    except Exception as e:
+                        error = e
+                        self.waiting_for_choice = False
+                if error is not None:
+                    self.bot_send(f"⚠ Search failed: {error}")
+                metrics.observe("gui.search_to_render", (time.perf_counter() - self.search_started) * 1000)
+        except queue.Empty:
+            pass
+        finally:
+            # Keep polling whatever happened to this batch.
+            self.root.after(50, self.poll_search_results)
+
+    def set_searching(self, searching):
+        self.searching = searching
+        self.search_btn.config(text="⏳ Searching…" if searching else "🔎 Search")
+
+    def show_search_results(self, results):
+        self.all_results = results
 
         self.current_page_start = 0
         self.shown_results = []
@@ -183,7 +302,28 @@ class ChatGPTStyleApp:
 
         self.show_next_page()
 
+    def show_similar(self, text):
+        # "similar" follows up the last pick; "similar N" starts from option
+        # N of the page on screen.
+        target = self.last_choice
+        arg = text.split()[-1]
+        if arg.isdigit():
+            n = int(arg)
+            if not 1 <= n <= len(self.current_results):
+                return self.bot_send("Out of range. Type similar 1-3 while options are shown.")
+            target = self.current_results[n - 1]
+        if target is None:
+            return self.bot_send("Pick a property first (type its number), then type similar.")
+
+        results = similar_listings(self.df, target["row"], self.similar_count)
+        self.bot_send(f"🏘 Listings most like {target['name']} ({target['city']}, {target['type']}):")
+        self.show_search_results(results)
+
     def show_next_page(self):
+        with metrics.span("gui.show_next_page"):
+            self.render_next_page()
+
+    def render_next_page(self):
         total = len(self.all_results)
         if self.current_page_start >= total:
             self.bot_send("No more properties. Type 0 to finish or search again.")
@@ -196,6 +336,7 @@ class ChatGPTStyleApp:
         self.current_page_start = end
 
         self.chat.config(state=tk.NORMAL)
+        self.begin_message()
         self.chat.insert(tk.END, "\nBot:\n", "bot_label")
         self.chat.insert(tk.END, "Here are the top options for you:\n", "bot_msg")
 
@@ -207,13 +348,17 @@ class ChatGPTStyleApp:
                 f"   💰 Price: {p['price']:.0f} EGP   •   📈 ROI: {p['roi']*100:.1f}%   •   ⚖ Risk: {p['risk_text']}\n",
                 "bot_msg"
             )
+            if p.get("return_5y_p50") is not None:
+                self.chat.insert(
+                    tk.END,
+                    f"   🎲 5-year return: P10 {p['return_5y_p10']*100:+.0f}%   •   "
+                    f"P50 {p['return_5y_p50']*100:+.0f}%   •   P90 {p['return_5y_p90']*100:+.0f}%\n",
+                    "bot_msg"
+                )
 
             if p.get("url"):
-                tag = f"url_{self.current_page_start}_{i}"
                 self.chat.insert(tk.END, "   🔗 Link: ", "bot_msg")
-                self.chat.insert(tk.END, "View property\n", (tag,))
-                self.chat.tag_config(tag, foreground="blue", underline=True)
-                self.chat.tag_bind(tag, "<Button-1>", lambda e, u=p["url"]: webbrowser.open(u))
+                self.insert_link(p["url"])
 
             self.chat.insert(tk.END, "─" * 36 + "\n", "bot_msg")
 
@@ -227,6 +372,46 @@ class ChatGPTStyleApp:
         self.chat.config(state=tk.DISABLED)
         self.chat.yview(tk.END)
 
+    def show_metrics_panel(self):
+        # Debug panel over the metrics module; a no-op notice unless the app
+        # was started with REALESTATE_METRICS set.
+        if not metrics.enabled():
+            return self.bot_send("Metrics are off. Start the app with REALESTATE_METRICS=1 to collect them.")
+
+        if self.metrics_window is not None and self.metrics_window.winfo_exists():
+            self.metrics_window.lift()
+            return self.refresh_metrics_panel()
+
+        win = self.metrics_window = tk.Toplevel(self.root)
+        win.title("Metrics")
+        win.geometry("760x420")
+
+        buttons = tk.Frame(win)
+        buttons.pack(side=tk.BOTTOM, fill=tk.X, padx=8, pady=8)
+        tk.Button(buttons, text="Refresh", command=self.refresh_metrics_panel).pack(side=tk.LEFT)
+        tk.Button(buttons, text="Reset", command=lambda: (metrics.reset(), self.refresh_metrics_panel())).pack(
+            side=tk.LEFT, padx=6
+        )
+        tk.Button(buttons, text="Save JSON…", command=self.save_metrics).pack(side=tk.RIGHT)
+
+        self.metrics_text = scrolledtext.ScrolledText(win, wrap=tk.NONE, font=("Consolas", 10))
+        self.metrics_text.pack(fill=tk.BOTH, expand=True, padx=8, pady=(8, 0))
+        self.refresh_metrics_panel()
+
+    def refresh_metrics_panel(self):
+        self.metrics_text.config(state=tk.NORMAL)
+        self.metrics_text.delete("1.0", tk.END)
+        self.metrics_text.insert(tk.END, metrics.report())
+        self.metrics_text.config(state=tk.DISABLED)
+
+    def save_metrics(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.metrics_window, defaultextension=".json", initialfile="metrics.json",
+            filetypes=[("JSON", "*.json")]
+        )
+        if path:
+            metrics.dump(path)
+
     def on_send(self, event=None):
         text = self.entry.get().strip()
         if not text:
@@ -237,8 +422,18 @@ class ChatGPTStyleApp:
         low = text.lower().strip()
 
         if low in ("9", "more", "next", "other", "others", "show more"):
+            if self.searching:
+                return self.bot_send("⏳ Still searching — one moment.")
             return self.show_next_page()
 
+        if low in ("metrics", "debug"):
+            return self.show_metrics_panel()
+
+        if low in ("similar", "more like this", "like this") or low.startswith("similar "):
+            if self.searching:
+                return self.bot_send("⏳ Still searching — one moment.")
+            return self.show_similar(low)
+
         if low in ("roi", "higher roi", "more roi"):
             self.override_weights = {"w_roi": 0.85, "w_risk": 0.10, "w_budget": 0.05}
             self.bot_send("✅ OK — prioritizing higher ROI. Searching again...")
@@ -278,10 +473,13 @@ class ChatGPTStyleApp:
             self.prefs.update_from_choice(chosen, self.user_budget)
             self.weights_label.config(text=self.weights_text())
             self.waiting_for_choice = False
+            self.last_choice = chosen
 
-            self.bot_send(f"Nice choice — {chosen['name']} ({chosen['city']}). I'll learn from that. 🤖")
+            self.bot_send(f"Nice choice — {chosen['name']} ({chosen['city']}). I'll learn from that. 🤖\n"
+                          "Type similar to see more listings like it.")
             if chosen.get("url"):
                 self.chat.config(state=tk.NORMAL)
+                self.begin_message()
                 self.chat.insert(tk.END, "\nBot:\n", "bot_label")
                 self.insert_clickable_link("Here is the link if you want to view your chosen property: ", chosen["url"])
             return
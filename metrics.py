@@ -0,0 +1,167 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Opt-in timing spans, counters and latency histograms. Off unless
+# REALESTATE_METRICS is set (or enable() is called); when off, span() hands
+# back a shared no-op object and count()/observe() return straight away.
+# REALESTATE_METRICS=path.json also dumps everything to that file at exit.
+ENV = "REALESTATE_METRICS"
+
+# Histogram bucket upper bounds in milliseconds: ten log-spaced buckets per
+# decade from 1 us to 100 s, so quantiles are good to about 10%.
+BOUNDS_MS = [round(10 ** (k / 10), 6) for k in range(-30, 51)]
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_enabled = False
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.buckets[bisect_left(BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        # Interpolated inside the bucket holding the q-th observation and
+        # clamped to the observed range.
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for upper, n in zip(BOUNDS_MS + [self.max], self.buckets):
+            if n and seen + n >= rank:
+                value = lower + (upper - lower) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+            lower = upper
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+            "min_ms": round(self.min, 4) if self.count else 0.0,
+            "max_ms": round(self.max, 4),
+            "p50_ms": round(self.quantile(0.50), 4),
+            "p95_ms": round(self.quantile(0.95), 4),
+            "p99_ms": round(self.quantile(0.99), 4),
+            "buckets": {f"<={b:g}ms": n for b, n in zip(BOUNDS_MS + [float("inf")], self.buckets) if n},
+        }
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def span(name):
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, ms):
+    if not _enabled:
+        return
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = Histogram()
+        h.observe(ms)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "enabled": _enabled,
+            "counters": dict(sorted(_counters.items())),
+            "spans": {name: h.summary() for name, h in sorted(_histograms.items())},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def dump(path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def report():
+    snap = snapshot()
+    lines = [f"{'Spans (ms)':24s}  count      p50      p95      p99      max     total"]
+    for name, s in snap["spans"].items():
+        lines.append(f"{name:24s} {s['count']:6d} {s['p50_ms']:8.3f} {s['p95_ms']:8.3f} "
+                     f"{s['p99_ms']:8.3f} {s['max_ms']:8.3f} {s['total_ms']:9.1f}")
+    lines.append("")
+    lines.append("Counters")
+    for name, value in snap["counters"].items():
+        lines.append(f"{name:28s} {value:>14,}")
+    return "\n".join(lines)
+
+
+_setting = os.environ.get(ENV, "").strip()
+if _setting and _setting != "0":
+    enable()
+    if _setting.lower().endswith(".json"):
+        atexit.register(dump, _setting)
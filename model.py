@@ -1,4 +1,18 @@
-from math import isfinite
+import heapq
+import threading
+import weakref
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Simulated total-return percentiles over five years (see
+# preprocess_and_features.simulate_returns); optional dataset columns.
+RETURN_COLUMNS = ("return_5y_p10", "return_5y_p50", "return_5y_p90")
 
 def classify_risk(r):
     r = int(r)
@@ -6,114 +20,576 @@ def classify_risk(r):
 
 def _minmax(x, lo, hi):
     if hi <= lo:
-        return 0.0
+        return np.zeros_like(x)
     return (x - lo) / (hi - lo)
 
-def recommend(df, budget, city, ptype, prefs, override_weights=None):
+def _text(col):
+    # (codes, values) for a text column: values[codes[i]] is row i, and the
+    # trailing NaN in values is what code -1 (a missing cell) picks up.
+    # Categorical columns hand over their codes without a copy.
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes, uniques = col.cat.codes.to_numpy(), col.cat.categories
+    else:
+        codes, uniques = pd.factorize(col)
+    values = np.empty(len(uniques) + 1, dtype=object)
+    values[:-1] = uniques.to_numpy(dtype=object)
+    values[-1] = np.nan
+    return codes, values
+
+def _lower_codes(col):
+    # Dictionary-encode a text column on its stripped, lowercased value
+    # (missing values compare as "nan", like str() of a NaN cell).
+    codes, values = _text(col)
+    keys = {}
+    remap = np.empty(len(values), dtype=np.min_scalar_type(-len(values)))
+    for i, u in enumerate(values):
+        remap[i] = keys.setdefault(str(u).strip().lower(), len(keys))
+    return remap[codes], keys
+
+
+class ResultCache:
+    # Bounded LRU of ranked results, keyed by filters and effective weights.
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def _floats(col):
+    # float32 columns stay float32 (ranking upcasts the candidates only).
+    values = pd.to_numeric(col, errors="coerce").to_numpy()
+    if values.dtype != np.float32:
+        values = values.astype(np.float64)
+    return values
+
+def _number(x):
+    # float32 keeps about 7 significant digits; rounding to 6 decimals
+    # drops the noise of widening it, so a stored 0.095 reads as 0.095.
+    return round(float(x), 6) if isinstance(x, np.float32) else float(x)
+
+def _risk_norm(risk):
+    return np.clip((risk - 1) / 2.0, 0.0, 1.0)
+
+def _decode(column, i):
+    codes, values = column
+    return values[codes[i]]
+
+def _positions(n):
+    return np.int32 if n < 2**31 else np.int64
+
+def _postings(codes, pos):
+    # Group positions by code, keeping each posting list in dataset order.
+    order = pos[np.argsort(codes[pos], kind="stable")]
+    keys, starts = np.unique(codes[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    return order, {int(k): (int(a), int(b)) for k, a, b in zip(keys, starts, ends)}
+
+def _runs(keys):
+    # A walk outward from the budget only guarantees the distance never
+    # shrinks; rows that tie on it are put in full key order here.
+    run = []
+    for key in keys:
+        if run and key[0] != run[0][0]:
+            run.sort()
+            yield from run
+            run = []
+        run.append(key)
+    run.sort()
+    yield from run
+
+
+class ListingIndex:
+    def __init__(self, df, include_outliers=False):
+        self.city_codes, self.city_keys = _lower_codes(df["city"])
+        self.type_codes, self.type_keys = _lower_codes(df["property_type"])
 
-    candidates = []
-    for _, r in df.iterrows():
-        r_city = str(r.get("city", "")).strip()
-        r_type = str(r.get("property_type", "")).strip()
+        self.price = pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype=np.float64)
+        self.roi = _floats(df["expected_roi"])
+        risk = pd.to_numeric(df["base_risk"], errors="coerce").to_numpy(dtype=np.float64)
 
-        if city != "Any" and r_city.lower() != str(city).strip().lower():
-            continue
-        if ptype != "Any" and r_type.lower() != str(ptype).strip().lower():
-            continue
+        valid = np.isfinite(self.price) & np.isfinite(self.roi) & np.isfinite(risk)
+        self.risk = np.trunc(np.where(valid, risk, 2)).astype(np.int8)
 
-        try:
-            price = float(r.get("price", 0))
-            roi   = float(r.get("expected_roi", 0))
-            risk  = int(r.get("base_risk", 2))
-        except Exception:
-            continue
+        # Listings clean_data flagged as price-per-sqm outliers are left out
+        # of every ranking unless include_outliers is set.
+        if not include_outliers and "is_outlier" in df.columns:
+            valid &= ~df["is_outlier"].fillna(False).astype(bool).to_numpy()
 
-        if not isfinite(price) or not isfinite(roi):
-            continue
+        # Display columns stay dictionary-encoded; result() decodes one row.
+        # Urls are nearly all distinct, so the index reads them straight
+        # from the frame's array (packed by data.compact_properties).
+        self.name = _text(df["name"])
+        self.city = _text(df["city"])
+        self.ptype = _text(df["property_type"])
+        self.url = df["url"].array
+        self.returns = None
+        if all(c in df.columns for c in RETURN_COLUMNS):
+            self.returns = [_floats(df[c]) for c in RETURN_COLUMNS]
 
+        self.valid_pos = np.flatnonzero(valid).astype(_positions(len(df)))
+        self.city_postings = _postings(self.city_codes, self.valid_pos)
+        self.type_postings = _postings(self.type_codes, self.valid_pos)
+
+        # One price-sorted run per (city, type) bucket, so a budget cut is
+        # a binary search instead of a scan. Equal prices are ordered the
+        # way price mode ranks them: (-roi, risk), then dataset order.
+        v = self.valid_pos
+        codes = self.city_codes.astype(np.int32) * len(self.type_keys) + self.type_codes
+        bucket = codes[v]
+        roi = self.roi[v]
+        risk_norm = _risk_norm(self.risk[v]).astype(np.float32)
+        self.bucket_order = v[np.lexsort((risk_norm, -roi, self.price[v], bucket))]
+        self.bucket_price = self.price[self.bucket_order]
+        _, self.buckets = _postings(codes, self.bucket_order)
+        self.n_types = len(self.type_keys)
+
+        # Roi and risk modes rank by (roi, risk) first, and those take few
+        # distinct values, so each bucket splits into a handful of cells of
+        # equal (roi, risk). Each cell is kept price-sorted, to walk outward
+        # from a budget, and in dataset order, for searches without one.
+        order = np.lexsort((self.price[v], risk_norm, -roi, bucket))
+        self.cell_by_price = v[order]
+        bucket, roi, risk_norm = bucket[order], roi[order], risk_norm[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (bucket[1:] != bucket[:-1]) | (roi[1:] != roi[:-1]) | (risk_norm[1:] != risk_norm[:-1])
+        cell = np.empty(len(order), dtype=np.int32)
+        cell[order] = np.cumsum(first) - 1
+        self.cell_by_pos = v[np.argsort(cell, kind="stable")]
+        starts = np.flatnonzero(first)
+        self.cells = (starts, np.append(starts[1:], len(order)), bucket[starts], roi[starts], risk_norm[starts])
+
+        self.cache = ResultCache()
+        self.similar = None  # similar.SimilarIndex, built by similar.build_similar
+
+    def _posting(self, postings, code, cap):
+        order, spans = postings
+        a, b = spans.get(code, (0, 0))
+        pos = order[a:b]
+        metrics.count("recommend.rows_scanned", len(pos))
+        if cap is not None:
+            pos = pos[self.price[pos] <= cap]
+        return pos
+
+    def _filters(self, budget, city, ptype):
+        # (city_code, type_code, price cap), None meaning no filter; None
+        # overall when the city or type is not in the data.
+        city_code = type_code = None
+        if city != "Any":
+            city_code = self.city_keys.get(str(city).strip().lower())
+            if city_code is None:
+                return None
+        if ptype != "Any":
+            type_code = self.type_keys.get(str(ptype).strip().lower())
+            if type_code is None:
+                return None
+
+        cap = None
         if budget and float(budget) > 0:
-            if price > float(budget) * 1.2:
+            cap = float(budget) * 1.2
+        return city_code, type_code, cap
+
+    def select(self, budget, city, ptype):
+        filters = self._filters(budget, city, ptype)
+        if filters is None:
+            return np.empty(0, dtype=self.valid_pos.dtype)
+        city_code, type_code, cap = filters
+
+        if city_code is not None and type_code is not None:
+            a, b = self.buckets.get(city_code * self.n_types + type_code, (0, 0))
+            if cap is not None:
+                b = a + int(np.searchsorted(self.bucket_price[a:b], cap, side="right"))
+            metrics.count("recommend.rows_scanned", b - a)
+            return np.sort(self.bucket_order[a:b])
+        if city_code is not None:
+            return self._posting(self.city_postings, city_code, cap)
+        if type_code is not None:
+            return self._posting(self.type_postings, type_code, cap)
+
+        pos = self.valid_pos
+        metrics.count("recommend.rows_scanned", len(pos))
+        if cap is not None:
+            pos = pos[self.price[pos] <= cap]
+        return pos
+
+    def _bucket_spans(self, city_code, type_code, cap):
+        spans = []
+        for code, (a, b) in self.buckets.items():
+            if city_code is not None and code // self.n_types != city_code:
+                continue
+            if type_code is not None and code % self.n_types != type_code:
+                continue
+            if cap is not None:
+                b = a + int(np.searchsorted(self.bucket_price[a:b], cap, side="right"))
+            spans.append((code, a, b))
+        return spans
+
+    def ranked(self, mode, budget, city, ptype):
+        # (match count, iterator of rows in rank order) for the roi, risk and
+        # price modes, read off the presorted orders: only rows up to the
+        # page being shown are visited, and only rows that tie on every
+        # budget-independent key are compared by budget distance.
+        filters = self._filters(budget, city, ptype)
+        if filters is None:
+            return 0, iter(())
+        city_code, type_code, cap = filters
+        spans = self._bucket_spans(city_code, type_code, cap)
+        count = sum(b - a for _, a, b in spans)
+        budget = float(budget) if cap is not None else None
+
+        if mode == "price":
+            return count, self._price_walk(spans, budget)
+        buckets = np.array([code for code, _, _ in spans], dtype=np.int64)
+        return count, self._cell_walk(mode, buckets, budget, cap)
+
+    def _sort_key(self, row):
+        return -float(self.roi[row]), min(max((int(self.risk[row]) - 1) / 2.0, 0.0), 1.0), row
+
+    def _diff(self, row, budget):
+        return max(0.0, abs(float(self.price[row]) - budget) / budget)
+
+    def _price_walk(self, spans, budget):
+        # Price mode ranks by budget distance (or by price without a budget),
+        # then -roi and risk: merge every bucket's price-sorted run, walking
+        # outward from the budget when there is one.
+        order, streams = self.bucket_order, []
+        for _, a, b in spans:
+            if budget is None:
+                streams.append((float(self.price[r]), *self._sort_key(r)) for r in order[a:b])
+                continue
+            split = a + int(np.searchsorted(self.bucket_price[a:b], budget, side="left"))
+            for rows in (order[split:b], order[a:split][::-1]):
+                streams.append(_runs((self._diff(r, budget), *self._sort_key(r)) for r in rows))
+        for key in heapq.merge(*streams):
+            yield key[-1]
+
+    def _cell_walk(self, mode, buckets, budget, cap):
+        # Cells of equal (roi, risk) in rank order; rows of the cells that
+        # tie are merged by budget distance, then dataset order.
+        starts, ends, bucket, roi, risk_norm = self.cells
+        cells = np.flatnonzero(np.isin(bucket, buckets))
+        if mode == "roi":
+            cells = cells[np.lexsort((risk_norm[cells], -roi[cells]))]
+        else:
+            cells = cells[np.lexsort((-roi[cells], risk_norm[cells]))]
+
+        price = self.price.__getitem__
+        group = []
+        for i, c in enumerate(cells):
+            group.append(c)
+            if i + 1 < len(cells) and roi[cells[i + 1]] == roi[c] and risk_norm[cells[i + 1]] == risk_norm[c]:
                 continue
 
-        risk_norm = (risk - 1) / 2.0 
-        diff = abs(price - budget) / budget if budget and budget > 0 else 0.0
+            streams = []
+            for g in group:
+                a, b = int(starts[g]), int(ends[g])
+                if budget is None:
+                    streams.append(iter(self.cell_by_pos[a:b]))
+                    continue
+                b = bisect_right(self.cell_by_price, cap, a, b, key=price)
+                split = bisect_left(self.cell_by_price, budget, a, b, key=price)
+                for rows in (self.cell_by_price[split:b], self.cell_by_price[a:split][::-1]):
+                    streams.append(_runs((self._diff(r, budget), r) for r in rows))
+            group = []
 
-        candidates.append({
-            "row": r,
-            "price": price,
-            "roi": roi,
-            "risk": risk,
-            "risk_norm": max(0.0, min(1.0, risk_norm)),
-            "diff": max(0.0, diff),
-        })
+            for item in heapq.merge(*streams):
+                yield item if budget is None else item[-1]
 
-    if not candidates:
-        return []
+    def result(self, i):
+        out = {
+            "row": int(i),
+            "name": str(_decode(self.name, i)),
+            "city": str(_decode(self.city, i)),
+            "type": str(_decode(self.ptype, i)),
+            "price": float(self.price[i]),
+            "roi": _number(self.roi[i]),
+            "risk_text": classify_risk(int(self.risk[i])),
+            "url": str(self.url[i]).strip(),
+        }
+        if self.returns is not None:
+            for column, values in zip(RETURN_COLUMNS, self.returns):
+                value = _number(values[i])
+                out[column] = value if value == value else None
+        return out
 
-    rois  = [c["roi"] for c in candidates]
-    diffs = [c["diff"] for c in candidates]
+    def nbytes(self):
+        total = 0
+        for value in vars(self).values():
+            if isinstance(value, tuple):
+                value = value[0]  # (codes, values); values are shared with the frame
+            if isinstance(value, np.ndarray):
+                total += value.nbytes
+        return total
 
-    roi_min, roi_max   = min(rois), max(rois)
-    diff_min, diff_max = min(diffs), max(diffs)
 
-    for c in candidates:
-        c["roi_norm"]  = _minmax(c["roi"], roi_min, roi_max)
-        c["diff_norm"] = _minmax(c["diff"], diff_min, diff_max)
+_INDEXES = {}
 
-    mode = "learned"
+def build_index(df, include_outliers=False):
+    index = ListingIndex(df, include_outliers)
+    key = id(df)
+    _INDEXES[key] = (weakref.ref(df), index)
+    weakref.finalize(df, _INDEXES.pop, key, None)
+    return index
 
-    if override_weights:
-        if override_weights.get("w_roi", 0) >= 0.7:
-            mode = "roi"
-        elif override_weights.get("w_risk", 0) >= 0.7:
-            mode = "risk"
-        elif override_weights.get("w_budget", 0) >= 0.7:
-            mode = "price"
+def get_index(df):
+    ref, index = _INDEXES.get(id(df), (None, None))
+    if ref is None or ref() is not df:
+        index = build_index(df)
+    return index
+
+def invalidate_results(df):
+    get_index(df).cache.invalidate()
+
+
+def _mode(prefs, override_weights):
+    w = override_weights or {"w_roi": prefs.w_roi, "w_risk": prefs.w_risk, "w_budget": prefs.w_budget}
+    if w.get("w_roi", 0) >= 0.7:
+        return "roi"
+    if w.get("w_risk", 0) >= 0.7:
+        return "risk"
+    if w.get("w_budget", 0) >= 0.7:
+        return "price"
+    return "learned"
+
+def _learned_keys(roi, risk_norm, diff, prefs):
+    # Sort keys for the learned weighting; ties fall back to dataset order,
+    # like the stable list.sort this replaced.
+    roi_norm = _minmax(roi, roi.min(), roi.max())
+    diff_norm = _minmax(diff, diff.min(), diff.max())
+
+    w_roi    = float(prefs.w_roi)
+    w_risk   = float(prefs.w_risk)
+    w_budget = float(prefs.w_budget)
+
+    score = w_roi * roi_norm - w_risk * risk_norm - w_budget * diff_norm
+    return [-score]
+
+def _top_k(keys, idx, k):
+    # Unordered set of the k smallest idx under (keys..., idx), found with
+    # np.partition one key at a time; only ties on the k-th value recurse.
+    if k >= len(idx):
+        return idx
+    if not keys:
+        return idx[:k]
+
+    key = keys[0]
+    kth = np.partition(key, k - 1)[k - 1]
+    below = key < kth
+    tied = np.flatnonzero(key == kth)
+    rest = _top_k([x[tied] for x in keys[1:]], idx[tied], k - int(below.sum()))
+    return np.concatenate([idx[below], rest])
+
+
+class RankedResults:
+    # Lazy ranked cursor: the ranking is extended with a partial selection
+    # and result dicts are built only for the slices that are read.
+    def __init__(self, index, pos, keys):
+        self._index = index
+        self._pos = pos
+        self._keys = keys
+        self._ranked = np.empty(0, dtype=np.int64)
+        self._rest = np.arange(len(pos))
+        self._results = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            wanted = range(*i.indices(len(self)))
+            self._materialize(max(wanted, default=-1) + 1)
+            return [self._results[j] for j in wanted]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("result index out of range")
+        self._materialize(i + 1)
+        return self._results[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _extend_ranking(self, n):
+        k = min(len(self._rest), max(n - len(self._ranked), len(self._ranked)))
+        rest = self._rest
+
+        top = _top_k([key[rest] for key in self._keys], np.arange(len(rest)), k)
+        top = np.sort(top)
+        top = top[np.lexsort([key[rest[top]] for key in reversed(self._keys)])]
+
+        self._ranked = np.concatenate([self._ranked, self._pos[rest[top]]])
+        keep = np.ones(len(rest), dtype=bool)
+        keep[top] = False
+        self._rest = rest[keep]
+
+    def _materialize(self, n):
+        with self._lock:
+            if n > len(self._ranked):
+                with metrics.span("recommend.sort"):
+                    self._extend_ranking(n)
+
+            with metrics.span("recommend.materialize"):
+                for i in self._ranked[len(self._results):n]:
+                    self._results.append(self._index.result(i))
+
+
+class PresortedResults(RankedResults):
+    # Ranked cursor over ListingIndex.ranked(): rows already come in rank
+    # order, so extending the ranking just reads as many as are needed.
+    def __init__(self, index, count, rows):
+        super().__init__(index, np.empty(0, dtype=np.int64), [])
+        self._count = count
+        self._rows = rows
+
+    def __len__(self):
+        return self._count
+
+    def _extend_ranking(self, n):
+        rows = np.fromiter(islice(self._rows, n - len(self._ranked)), dtype=np.int64)
+        metrics.count("recommend.rows_scanned", len(rows))
+        self._ranked = np.concatenate([self._ranked, rows])
+
+def _features(index, pos, budget):
+    price = index.price[pos]
+    roi   = index.roi[pos].astype(np.float64, copy=False)
+
+    risk_norm = _risk_norm(index.risk[pos])
+    if budget and budget > 0:
+        diff = np.maximum(0.0, np.abs(price - budget) / budget)
     else:
-        if prefs.w_roi >= 0.7:
-            mode = "roi"
-        elif prefs.w_risk >= 0.7:
-            mode = "risk" 
-        elif prefs.w_budget >= 0.7:
-            mode = "price"
-
-    if mode == "roi":
-        candidates.sort(key=lambda c: (-c["roi"], c["risk_norm"], c["diff"]))
-
-    elif mode == "risk":
-        candidates.sort(key=lambda c: (c["risk_norm"], -c["roi"], c["diff"]))
-
-    elif mode == "price":
-        if budget and budget > 0:
-            candidates.sort(key=lambda c: (c["diff"], -c["roi"], c["risk_norm"]))
-        else:
-            candidates.sort(key=lambda c: (c["price"], -c["roi"], c["risk_norm"]))
+        diff = np.zeros(len(pos))
+    return price, roi, risk_norm, diff
+
+def recommend(df, budget, city, ptype, prefs, override_weights=None):
+    with metrics.span("recommend"):
+        return _recommend(df, budget, city, ptype, prefs, override_weights)
+
+def _recommend(df, budget, city, ptype, prefs, override_weights):
+    index = get_index(df)
+    metrics.count("recommend.calls")
+
+    mode = _mode(prefs, override_weights)
+    if mode == "learned":
+        key = (budget, city, ptype, (prefs.w_roi, prefs.w_risk, prefs.w_budget))
+    else:
+        key = (budget, city, ptype, mode)
+
+    results = index.cache.get(key)
+    if results is not None:
+        metrics.count("recommend.cache_hits")
+        return results
+    metrics.count("recommend.cache_misses")
+
+    if mode == "learned":
+        with metrics.span("recommend.filter"):
+            pos = index.select(budget, city, ptype)
+        metrics.count("recommend.candidates_kept", len(pos))
 
+        keys = []
+        if len(pos):
+            with metrics.span("recommend.normalize"):
+                _, roi, risk_norm, diff = _features(index, pos, budget)
+                keys = _learned_keys(roi, risk_norm, diff, prefs)
+        results = RankedResults(index, pos, keys)
     else:
-        w_roi    = float(prefs.w_roi)
-        w_risk   = float(prefs.w_risk)
-        w_budget = float(prefs.w_budget)
-
-        candidates.sort(
-            key=lambda c: (
-                w_roi * c["roi_norm"]
-                - w_risk * c["risk_norm"]
-                - w_budget * c["diff_norm"]
-            ),
-            reverse=True
-        )
-
-    results = []
-    for c in candidates:
-        r = c["row"]
-        results.append({
-            "name": str(r.get("name", "")),
-            "city": str(r.get("city", "")),
-            "type": str(r.get("property_type", "")),
-            "price": float(c["price"]),
-            "roi": float(c["roi"]),
-            "risk_text": classify_risk(int(c["risk"])),
-            "url": str(r.get("url", "")).strip(),
-        })
+        # Fixed modes walk orders the index presorted at load time.
+        with metrics.span("recommend.filter"):
+            count, rows = index.ranked(mode, budget, city, ptype)
+        metrics.count("recommend.candidates_kept", count)
+        results = PresortedResults(index, count, rows)
 
+    index.cache.put(key, results)
     return results
+
+
+# Batch scoring: queries sharing (budget, city, ptype) share one filtered
+# candidate set and one normalized feature matrix, and every learned-mode
+# user in the group is scored by a single matrix multiply against it.
+
+BATCH_CELLS = 1 << 24  # scores held at once (rows x users), ~128 MB
+
+def _learned_top(roi_norm, risk_norm, diff_norm, weights, k):
+    # The matmul finds each user's candidates; they are re-scored with the
+    # exact expression recommend() uses so ties rank identically.
+    n = len(roi_norm)
+    k = min(k, n)
+    features = np.column_stack([roi_norm, -risk_norm, -diff_norm])
+    block = max(1, BATCH_CELLS // max(n, 1))
+
+    tops = []
+    for start in range(0, len(weights), block):
+        w = weights[start:start + block]
+        scores = features @ w.T
+        kth = np.partition(scores, n - k, axis=0)[n - k]
+        for col, (w_roi, w_risk, w_budget) in enumerate(w):
+            cand = np.flatnonzero(scores[:, col] >= kth[col] - 1e-9)
+            exact = w_roi * roi_norm[cand] - w_risk * risk_norm[cand] - w_budget * diff_norm[cand]
+            tops.append(cand[np.lexsort((cand, -exact))][:k])
+    return tops
+
+def recommend_batch(df, queries, prefs_by_user, k=10):
+    # queries: (user_id, budget, city, ptype) tuples; prefs_by_user maps a
+    # user_id to anything with w_roi / w_risk / w_budget. Returns the top-k
+    # result dicts per query, in query order, as recommend() would rank them.
+    with metrics.span("recommend_batch"):
+        index = get_index(df)
+        queries = list(queries)
+        out = [[] for _ in queries]
+
+        groups = {}
+        for qi, (user_id, budget, city, ptype) in enumerate(queries):
+            groups.setdefault((budget, city, ptype), []).append((qi, prefs_by_user[user_id]))
+        metrics.count("recommend_batch.queries", len(queries))
+        metrics.count("recommend_batch.groups", len(groups))
+
+        for (budget, city, ptype), members in groups.items():
+            by_mode = {}
+            for qi, prefs in members:
+                by_mode.setdefault(_mode(prefs, None), []).append((qi, prefs))
+
+            for mode, items in by_mode.items():
+                if mode == "learned":
+                    pos = index.select(budget, city, ptype)
+                    if not len(pos):
+                        continue
+                    _, roi, risk_norm, diff = _features(index, pos, budget)
+                    weights = np.array([[float(p.w_roi), float(p.w_risk), float(p.w_budget)] for _, p in items])
+                    roi_norm = _minmax(roi, roi.min(), roi.max())
+                    diff_norm = _minmax(diff, diff.min(), diff.max())
+                    tops = [pos[top] for top in _learned_top(roi_norm, risk_norm, diff_norm, weights, k)]
+                else:
+                    _, rows = index.ranked(mode, budget, city, ptype)
+                    tops = [list(islice(rows, k))] * len(items)
+
+                for (qi, _), top in zip(items, tops):
+                    out[qi] = [index.result(i) for i in top]
+        return out
@@ -0,0 +1,225 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, no_default, register_extension_dtype, take
+from pandas.api.indexers import check_array_indexer
+from pandas.api.types import is_integer, is_list_like, pandas_dtype
+
+# Text column for nearly unique strings such as urls. Every value lives in
+# one UTF-8 byte buffer (row i is buffer[start:start + length], length -1
+# when missing) and the prefix all values share is kept once, so a million
+# urls cost their distinct tails plus 12 bytes a row instead of a Python
+# string object each. Slicing, filtering and take share the buffer.
+#
+# The buffer only ever grows: assigning a value appends its bytes, so every
+# array cut from the same buffer stays valid and views see assignments as
+# they would on a numpy array. Anything without a packed implementation
+# (.str methods, astype) runs on the values as an object array, the same
+# as for a plain string column.
+
+
+@register_extension_dtype
+class PackedStringDtype(ExtensionDtype):
+    name = "packed_string"
+    type = str
+    kind = "O"
+    na_value = np.nan
+
+    def __repr__(self):
+        return self.name
+
+    @classmethod
+    def construct_array_type(cls):
+        return PackedStringArray
+
+
+def _check_strings(values):
+    for v in values:
+        if not (isinstance(v, str) or pd.isna(v)):
+            raise TypeError(f"{PackedStringDtype()} holds strings, not {v!r}")
+
+
+def _encode(values, prefix):
+    # Byte tails and lengths (-1 when missing) of values after prefix.
+    values = np.asarray(values, dtype=object)
+    present = ~pd.isna(values)
+    tails = [str(v)[len(prefix):].encode() for v in values[present]]
+    lengths = np.full(len(values), -1, dtype=np.int32)
+    lengths[present] = [len(b) for b in tails]
+    return b"".join(tails), lengths
+
+
+class PackedStringArray(ExtensionArray):
+    def __init__(self, prefix, buffer, starts, lengths):
+        self.prefix = prefix
+        self._store = buffer if isinstance(buffer, list) else [buffer]
+        self.starts = starts
+        self.lengths = lengths
+
+    @classmethod
+    def from_strings(cls, values):
+        values = np.asarray(values, dtype=object)
+        present = ~pd.isna(values)
+        text = [str(v) for v in values[present]]
+        prefix = os.path.commonprefix(text) if text else ""
+        data, lengths = _encode(values, prefix)
+        starts = np.zeros(len(values), dtype=np.int64)
+        starts[present] = np.cumsum(lengths[present]) - lengths[present]
+        return cls(prefix, np.frombuffer(data, dtype=np.uint8), starts, lengths)
+
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        if isinstance(scalars, cls):
+            return scalars.copy() if copy else scalars
+        scalars = np.asarray(scalars, dtype=object)
+        _check_strings(scalars)
+        return cls.from_strings(scalars)
+
+    @classmethod
+    def _from_sequence_of_strings(cls, strings, *, dtype=None, copy=False):
+        return cls.from_strings(strings)
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls.from_strings(values)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        first = to_concat[0]
+        if all(a._store is first._store and a.prefix == first.prefix for a in to_concat):
+            return cls(first.prefix, first._store, np.concatenate([a.starts for a in to_concat]),
+                       np.concatenate([a.lengths for a in to_concat]))
+        return cls.from_strings(np.concatenate([np.asarray(a, dtype=object) for a in to_concat]))
+
+    @property
+    def dtype(self):
+        return PackedStringDtype()
+
+    @property
+    def buffer(self):
+        return self._store[0]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.starts.nbytes + self.lengths.nbytes + len(self.prefix)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def _value(self, i):
+        n = int(self.lengths[i])
+        if n < 0:
+            return np.nan
+        start = int(self.starts[i])
+        return self.prefix + self.buffer[start:start + n].tobytes().decode()
+
+    def __getitem__(self, item):
+        if is_integer(item):
+            return self._value(item)
+        if item is Ellipsis:
+            return self
+        if isinstance(item, tuple):
+            if item[0] is Ellipsis:
+                item = item[1:]
+            elif item[-1] is Ellipsis:
+                item = item[:-1]
+            if len(item) != 1:
+                raise IndexError("too many indices for array")
+            return self[item[0]]
+        if isinstance(item, slice):
+            # A view, like a numpy slice.
+            result = type(self)(self.prefix, self._store, self.starts[item], self.lengths[item])
+            result._readonly = self._readonly
+            return result
+        item = check_array_indexer(self, item)
+        return type(self)(self.prefix, self._store, self.starts[item], self.lengths[item])
+
+    def __setitem__(self, key, value):
+        if self._readonly:
+            raise ValueError("Cannot modify read-only array")
+        if not (is_integer(key) or isinstance(key, slice)):
+            key = check_array_indexer(self, key)
+        if is_list_like(value):
+            values = np.asarray(value, dtype=object)
+        else:
+            values = np.array([value], dtype=object)
+        _check_strings(values)
+
+        if not all(pd.isna(v) or v.startswith(self.prefix) for v in values):
+            # A value outside the shared prefix: repack this array with a
+            # shorter one.
+            full = np.asarray(self, dtype=object)
+            full[key] = values if is_list_like(value) else value
+            packed = self.from_strings(full)
+            self.prefix, self._store = packed.prefix, packed._store
+            self.starts, self.lengths = packed.starts, packed.lengths
+            return
+
+        data, lengths = _encode(values, self.prefix)
+        starts = len(self.buffer) + np.cumsum(lengths.clip(0)) - lengths.clip(0)
+        if data:
+            self._store[0] = np.concatenate([self.buffer, np.frombuffer(data, dtype=np.uint8)])
+        if not (self.starts.flags.writeable and self.lengths.flags.writeable):
+            # Memory-mapped from a snapshot.
+            self.starts, self.lengths = self.starts.copy(), self.lengths.copy()
+        if not is_list_like(value):
+            starts, lengths = starts[0], lengths[0]
+        self.starts[key] = starts
+        self.lengths[key] = lengths
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._value(i)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError("Packed strings cannot be viewed as a numpy array without a copy")
+        values = np.empty(len(self), dtype=object)
+        values[:] = list(self)
+        return values if dtype is None else values.astype(dtype)
+
+    def to_numpy(self, dtype=None, copy=False, na_value=no_default):
+        # Always a new array, so never read-only.
+        values = np.asarray(self, dtype=dtype)
+        if na_value is not no_default:
+            values[self.isna()] = na_value
+        return values
+
+    def _objects(self):
+        return pd.array(np.asarray(self, dtype=object), dtype=object)
+
+    def __getattr__(self, name):
+        # .str methods: pandas calls _str_<method> on the column's array.
+        if name.startswith("_str_"):
+            return getattr(self._objects(), name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def astype(self, dtype, copy=True):
+        dtype = pandas_dtype(dtype)
+        if isinstance(dtype, PackedStringDtype):
+            return self.copy() if copy else self
+        if dtype == object:
+            return np.asarray(self, dtype=object)
+        return self._objects().astype(dtype, copy=False)
+
+    def __eq__(self, other):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if not isinstance(other, str):
+            other = np.asarray(other, dtype=object)
+        return np.asarray(self, dtype=object) == other
+
+    def isna(self):
+        return self.lengths < 0
+
+    def take(self, indices, allow_fill=False, fill_value=None):
+        if allow_fill and fill_value is not None and not pd.isna(fill_value):
+            values = take(np.asarray(self, dtype=object), indices, allow_fill=True, fill_value=fill_value)
+            return self.from_strings(values)
+        starts = take(self.starts, indices, allow_fill=allow_fill, fill_value=0)
+        lengths = take(self.lengths, indices, allow_fill=allow_fill, fill_value=-1)
+        return type(self)(self.prefix, self._store, starts, lengths)
+
+    def copy(self):
+        return type(self)(self.prefix, self._store, self.starts.copy(), self.lengths.copy())
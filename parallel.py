@@ -0,0 +1,36 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def split_rows(df, parts):
+    bounds = np.linspace(0, len(df), parts + 1).astype(int)
+    return [df.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def ordered_map(fn, items, workers, window=None):
+    # map() over a process pool: results come back in input order, with at
+    # most `window` items in flight so streamed inputs stay bounded.
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+
+    window = window or 2 * workers
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def map_partitions(fn, df, workers):
+    # Run fn over contiguous row ranges and stitch the results back together
+    # in their original order.
+    if workers <= 1 or len(df) < 2:
+        return fn(df)
+    return pd.concat(list(ordered_map(fn, split_rows(df, workers), workers)))
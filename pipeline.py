@@ -0,0 +1,196 @@
+import argparse
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import time
+
+import clean_data
+import preprocess_and_features as features
+import metrics
+from data import snapshot_path
+
+STATE = ".pipeline_state.json"
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def file_fingerprint(path, known):
+    # Content hash of a file (or a snapshot directory's meta.json), reused
+    # from `known` while the file's size and mtime are unchanged.
+    if os.path.isdir(path):
+        path = os.path.join(path, "meta.json")
+    if not os.path.exists(path):
+        return None
+
+    stat = _stat(path)
+    cached = known.get(path)
+    if cached and cached["stat"] == stat:
+        return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    known[path] = {"stat": stat, "sha256": digest.hexdigest()}
+    return known[path]["sha256"]
+
+
+def _local_path(name):
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    path = spec.origin if spec else None
+    if not path or not path.endswith(".py") or "site-packages" in path:
+        return None
+    path = os.path.abspath(path)
+    return path if path.startswith(ROOT + os.sep) else None
+
+
+def code_modules(module):
+    # {module name: source} for `module` and every repo-local module it
+    # imports, directly or through other local modules. Imports are read
+    # from the source, so constants pulled in with `from x import NAME`
+    # count as well.
+    found = {}
+    pending = [module.__name__]
+    while pending:
+        name = pending.pop()
+        path = None if name in found else _local_path(name)
+        if path is None:
+            continue
+        with open(path, encoding="utf-8") as f:
+            found[name] = f.read()
+        for node in ast.walk(ast.parse(found[name])):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module)
+    return found
+
+
+class Stage:
+    def __init__(self, name, func, inputs, outputs, params=None):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params or {}
+
+    def fingerprint(self, known):
+        modules = code_modules(inspect.getmodule(self.func))
+        payload = json.dumps({
+            "inputs": {p: file_fingerprint(p, known) for p in self.inputs},
+            "code": {name: hashlib.sha256(source.encode()).hexdigest() for name, source in modules.items()},
+            "params": self.params,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def outputs_fingerprint(self, known):
+        return {p: file_fingerprint(p, known) for p in self.outputs}
+
+
+class Pipeline:
+    def __init__(self, stages, state_path=STATE):
+        self.stages = stages
+        self.state_path = state_path
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def run(self, force=False):
+        state = self.load_state()
+        known = state.setdefault("files", {})
+        stages = state.setdefault("stages", {})
+        report = []
+
+        for stage in self.stages:
+            missing = [p for p in stage.inputs if not os.path.exists(p)]
+            if missing:
+                raise FileNotFoundError(f"Stage {stage.name!r} is missing inputs: {missing}")
+
+            fingerprint = stage.fingerprint(known)
+            previous = stages.get(stage.name, {})
+            if (not force
+                    and previous.get("fingerprint") == fingerprint
+                    and previous.get("outputs") == stage.outputs_fingerprint(known)):
+                report.append((stage.name, "skipped", previous))
+                metrics.count(f"pipeline.{stage.name}.skipped")
+                continue
+
+            print(f"== Running stage {stage.name!r} ==")
+            started = time.perf_counter()
+            with metrics.span(f"pipeline.{stage.name}"):
+                rows = stage.func(**stage.params)
+            stages[stage.name] = {
+                "fingerprint": fingerprint,
+                "outputs": stage.outputs_fingerprint(known),
+                "wall_time": round(time.perf_counter() - started, 3),
+                "rows": rows,
+                "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self.save_state(state)
+            report.append((stage.name, "ran", stages[stage.name]))
+
+        self.save_state(state)
+        for name, status, info in report:
+            print(f"{name:10s} {status:8s} {info.get('wall_time', 0):8.2f}s  {info.get('rows') or 0:>10,} rows")
+        return report
+
+
+def build_pipeline(raw_csv=clean_data.RAW_CSV, cleaned=clean_data.OUT_CSV, outfile=features.OUTFILE,
+                   workers=1, chunksize=None, max_memory_mb=None, skip_excel=False,
+                   scenarios=features.SCENARIOS, seed=features.SIM_SEED, report_csv=None, dedup=True):
+    report_csv = clean_data.report_path(cleaned, report_csv)
+    return Pipeline([
+        Stage("clean", clean_data.main, inputs=[raw_csv], outputs=[cleaned, report_csv], params={
+            "raw_csv": raw_csv, "out_csv": cleaned, "chunksize": chunksize,
+            "max_memory_mb": max_memory_mb, "workers": workers, "report_csv": report_csv, "dedup": dedup,
+        }),
+        Stage("features", features.main, inputs=[cleaned],
+              outputs=([] if skip_excel else [outfile]) + [snapshot_path(outfile)], params={
+            "cleaned": cleaned, "outfile": outfile, "workers": workers, "skip_excel": skip_excel,
+            "scenarios": scenarios, "seed": seed,
+        }),
+    ])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run clean -> features -> export, skipping up-to-date stages.")
+    parser.add_argument("--raw-csv", default=clean_data.RAW_CSV)
+    parser.add_argument("--cleaned", default=clean_data.OUT_CSV)
+    parser.add_argument("--outfile", default=features.OUTFILE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--max-memory-mb", type=float, default=None)
+    parser.add_argument("--report-csv", default=None,
+                        help=f"price-per-sqm outlier report (default: {clean_data.OUTLIER_REPORT} next to --cleaned)")
+    parser.add_argument("--keep-duplicates", dest="dedup", action="store_false",
+                        help="skip dropping reposted listings")
+    parser.add_argument("--skip-excel", action="store_true", help="only write the binary snapshot, not the .xlsx")
+    parser.add_argument("--scenarios", type=int, default=features.SCENARIOS)
+    parser.add_argument("--seed", type=int, default=features.SIM_SEED)
+    parser.add_argument("--force", action="store_true", help="rerun every stage")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = vars(parse_args())
+    force = args.pop("force")
+    build_pipeline(**args).run(force=force)
@@ -0,0 +1,210 @@
+import json
+import os
+import sqlite3
+import threading
+
+FIELDS = ("w_roi", "w_risk", "w_budget", "interactions")
+
+# learning.json is a snapshot; every update is appended to learning.json.log
+# as one full per-user record, and the log is folded back into the snapshot
+# once it grows past COMPACT_BYTES.
+COMPACT_BYTES = 64 * 1024
+
+_compaction = threading.Lock()
+_appending = threading.Lock()  # keeps an append from landing in a log being compacted
+
+# In-process view of each store file ({path: {user: record}}), read once and
+# then kept current by every append, so lookups never re-parse the files.
+_users = {}
+_users_lock = threading.Lock()
+
+
+def _replay(log_path, users):
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash mid-append
+            users[record.pop("user")] = record
+
+
+def read_users(path):
+    users = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            users = json.load(f).get("users", {})
+
+    # Records are full user states, so replaying one twice is harmless.
+    _replay(path + ".log.compacting", users)
+    _replay(path + ".log", users)
+    return users
+
+
+def compact(path):
+    log_path = path + ".log"
+    pending = log_path + ".compacting"
+    with _compaction:
+        if not os.path.exists(pending):
+            with _appending:
+                if not os.path.exists(log_path):
+                    return
+                os.replace(log_path, pending)
+
+        users = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                users = json.load(f).get("users", {})
+        _replay(pending, users)
+
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"users": users}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        os.remove(pending)
+
+
+def compact_in_background(path):
+    threading.Thread(target=compact, args=(path,), daemon=True).start()
+
+
+def _cached_users(path):
+    key = os.path.abspath(path)
+    with _users_lock:
+        if key not in _users:
+            # Under the compaction lock the files are either all before or
+            # all after a compaction, never half way through one.
+            with _compaction:
+                _users[key] = read_users(path)
+        return _users[key]
+
+
+class JsonPreferenceStore:
+    # learning.json plus its append-only log; safe across threads, not
+    # across processes.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        record = _cached_users(self.path).get(user_id)
+        return dict(record) if record else record
+
+    def put_many(self, records):
+        lines = "".join(
+            json.dumps({"user": user_id, **record}, separators=(",", ":")) + "\n"
+            for user_id, record in records
+        )
+        users = _cached_users(self.path)
+        log_path = self.path + ".log"
+        with _appending, open(log_path, "a+") as f:
+            if f.tell():
+                f.seek(f.tell() - 1)
+                if f.read(1) != "\n":
+                    lines = "\n" + lines  # don't glue onto a torn record
+            f.write(lines)
+            size = f.tell()
+            for user_id, record in records:
+                users[user_id] = dict(record)
+
+        if size >= COMPACT_BYTES and not _compaction.locked():
+            compact_in_background(self.path)
+
+    def put(self, user_id, record):
+        self.put_many([(user_id, record)])
+
+    def update(self, user_id, change):
+        with self._lock:
+            record = change(self.get(user_id))
+            self.put(user_id, record)
+        return record
+
+    def close(self):
+        pass
+
+
+class SqlitePreferenceStore:
+    # One row per user in a WAL-mode SQLite file: point lookups by primary
+    # key, and read-modify-write under BEGIN IMMEDIATE so concurrent
+    # processes serialize instead of overwriting each other.
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS preferences ("
+            " user_id TEXT PRIMARY KEY, w_roi REAL, w_risk REAL, w_budget REAL,"
+            " interactions INTEGER) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _get(self, user_id):
+        row = self._conn.execute(
+            "SELECT w_roi, w_risk, w_budget, interactions FROM preferences WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def _put_many(self, records):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO preferences VALUES (?, ?, ?, ?, ?)",
+            ((user_id, *(r[f] for f in FIELDS)) for user_id, r in records),
+        )
+
+    def get(self, user_id):
+        with self._lock:
+            return self._get(user_id)
+
+    def put_many(self, records):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._put_many(records)
+
+    def put(self, user_id, record):
+        self.put_many([(user_id, record)])
+
+    def update(self, user_id, change):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            record = change(self._get(user_id))
+            self._put_many([(user_id, record)])
+        return record
+
+    def migrate_json(self, json_path):
+        # One-time import of learning.json (and its log); later runs are a
+        # no-op once the source is recorded in the meta table.
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            done = self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone()
+            if done or not (os.path.exists(json_path) or os.path.exists(json_path + ".log")):
+                return 0
+
+            users = read_users(json_path)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO preferences VALUES (?, ?, ?, ?, ?)",
+                ((user_id, float(u.get("w_roi", 0.5)), float(u.get("w_risk", 0.3)),
+                  float(u.get("w_budget", 0.2)), int(u.get("interactions", 0)))
+                 for user_id, u in users.items()),
+            )
+            self._conn.execute("INSERT INTO meta VALUES ('migrated_from', ?)", (os.path.abspath(json_path),))
+            return len(users)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(path):
+    if path.endswith(".json"):
+        return JsonPreferenceStore(path)
+
+    store = SqlitePreferenceStore(path)
+    store.migrate_json(os.path.join(os.path.dirname(path), "learning.json"))
+    return store
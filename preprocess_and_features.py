@@ -1,100 +1,198 @@
 
+import argparse
+from functools import partial
+
 import numpy as np
 import pandas as pd
 
+import metrics
+from data import write_snapshot
+from model import RETURN_COLUMNS
+from parallel import map_partitions
+
 CLEANED = "cleaned_listings.csv"
 OUTFILE = "properties.xlsx"
 
-def roi_from_location(governorate, city_area):
-    gov = str(governorate).lower()
-    area = str(city_area).lower()
-
-    if "cairo" in gov:
-        if "new cairo" in area or "5" in area or "settlement" in area or "zayed" in area or "october" in area:
-            return 0.10
-        return 0.085
-
-    if "alex" in gov:
-        return 0.085
+CAIRO_PRIME_ROI = ("new cairo", "5", "settlement", "zayed", "october")
+CAIRO_PRIME_RISK = ("new cairo", "5", "zayed", "october")
+COAST_ROI = ("coast", "sokhna", "marassi", "gouna", "sahel", "north")
+COAST_RISK = ("coast", "sokhna", "gouna", "sahel", "marassi")
 
-    coast_keywords = ["coast", "sokhna", "marassi", "gouna", "sahel", "north"]
-    if any(k in area for k in coast_keywords):
-        return 0.14
+# Scoring rules as data. A table is a default value plus an ordered list of
+# (conditions, value) rules; the first rule whose conditions all hold wins.
+# ("column", "contains", keywords) holds when any keyword is a substring of
+# the lowercased value; the other operators compare a numeric column with
+# a threshold (missing values never match).
+ROI_TABLES = [
+    {   # location
+        "default": 0.09,
+        "rules": [
+            ([("governorate", "contains", ("cairo",)), ("city_area", "contains", CAIRO_PRIME_ROI)], 0.10),
+            ([("governorate", "contains", ("cairo",))], 0.085),
+            ([("governorate", "contains", ("alex",))], 0.085),
+            ([("city_area", "contains", COAST_ROI)], 0.14),
+            ([("city_area", "contains", ("capital",))], 0.12),
+            ([("governorate", "contains", ("capital",))], 0.12),
+        ],
+    },
+    {   # property type
+        "default": 0.0,
+        "rules": [
+            ([("property_type", "contains", ("villa",))], -0.015),
+            ([("property_type", "contains", ("chalet", "cabin"))], 0.03),
+            ([("property_type", "contains", ("duplex",))], 0.01),
+        ],
+    },
+    {   # price band
+        "default": 0.0,
+        "rules": [
+            ([("price_egp", "<", 2_000_000)], -0.01),
+            ([("price_egp", ">=", 2_000_000), ("price_egp", "<=", 10_000_000)], 0.01),
+            ([("price_egp", ">", 15_000_000)], -0.02),
+        ],
+    },
+    {   # down payment
+        "default": 0.0,
+        "rules": [
+            ([("down_payment_egp", ">=", 1_000_000)], 0.005),
+        ],
+    },
+]
+ROI_RANGE = (0.05, 0.22)
 
-    if "capital" in area or "capital" in gov:
-        return 0.12
+RISK_TABLE = {
+    "default": 2,
+    "rules": [
+        ([("city_area", "contains", COAST_RISK)], 3),
+        ([("price_egp", ">", 15_000_000)], 3),
+        ([("property_type", "contains", ("chalet", "cabin"))], 3),
+        ([("governorate", "contains", ("cairo",)), ("city_area", "contains", CAIRO_PRIME_RISK)], 1),
+        ([("price_egp", "<", 3_000_000), ("property_type", "contains", ("apartment",))], 1),
+    ],
+}
 
-    return 0.09
+# Return simulation: expected_roi is split into a rent yield and price
+# appreciation, and both are drawn with regional spreads year by year over
+# HORIZON_YEARS. The tables give the mean rent yield, its yearly spread and
+# the yearly spread of appreciation.
+RENT_YIELD_TABLE = {
+    "default": 0.06,
+    "rules": [
+        ([("city_area", "contains", COAST_ROI)], 0.07),
+        ([("city_area", "contains", ("capital",))], 0.05),
+        ([("governorate", "contains", ("capital",))], 0.05),
+    ],
+}
+RENT_SPREAD_TABLE = {
+    "default": 0.01,
+    "rules": [
+        ([("city_area", "contains", COAST_ROI)], 0.02),
+    ],
+}
+APPRECIATION_SPREAD_TABLE = {
+    "default": 0.08,
+    "rules": [
+        ([("city_area", "contains", ("capital",))], 0.12),
+        ([("governorate", "contains", ("capital",))], 0.12),
+        ([("city_area", "contains", COAST_ROI)], 0.10),
+        ([("governorate", "contains", ("cairo",)), ("city_area", "contains", CAIRO_PRIME_ROI)], 0.06),
+    ],
+}
+HORIZON_YEARS = 5
+SCENARIOS = 10_000
+SIM_SEED = 0
+SIM_CELLS = 1 << 22  # simulated values held at once
 
+COMPARE = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
 
-def adjust_roi_property_type(base_roi, ptype):
-    t = str(ptype).lower()
-    if "villa" in t:
-        return base_roi - 0.015
-    if "chalet" in t or "cabin" in t:
-        return base_roi + 0.03
-    if "duplex" in t:
-        return base_roi + 0.01
-    return base_roi
 
+class RuleContext:
+    # Column state shared by every rule in one scoring pass: text columns
+    # are factorized and lowercased once, and each keyword set is matched
+    # against the distinct values only.
+    def __init__(self, df):
+        self.df = df
+        self._text = {}
+        self._masks = {}
 
-def adjust_roi_price(base_roi, price):
-    if price < 2_000_000:
-        return base_roi - 0.01
-    if 2_000_000 <= price <= 10_000_000:
-        return base_roi + 0.01
-    if price > 15_000_000:
-        return base_roi - 0.02
-    return base_roi
+    def _distinct(self, column):
+        if column not in self._text:
+            codes, uniques = pd.factorize(self.df[column])
+            lowered = [str(u).lower() for u in uniques] + [str(np.nan)]
+            self._text[column] = (codes, lowered)
+        return self._text[column]
 
+    def mask(self, condition):
+        if condition not in self._masks:
+            column, op, arg = condition
+            if op == "contains":
+                codes, lowered = self._distinct(column)
+                hits = np.array([any(k in v for k in arg) for v in lowered])
+                self._masks[condition] = hits[codes]
+            else:
+                values = pd.to_numeric(self.df[column], errors="coerce").to_numpy(dtype=float)
+                self._masks[condition] = COMPARE[op](values, arg)
+        return self._masks[condition]
 
-def adjust_roi_payment(base_roi, down_payment):
-    if pd.isna(down_payment):
-        return base_roi
-    if down_payment >= 1_000_000:
-        return base_roi + 0.005
-    return base_roi
+    def evaluate(self, table):
+        conditions = []
+        for rule_conditions, _ in table["rules"]:
+            m = np.ones(len(self.df), dtype=bool)
+            for condition in rule_conditions:
+                m &= self.mask(condition)
+            conditions.append(m)
+        values = [value for _, value in table["rules"]]
+        return np.select(conditions, values, default=table["default"])
 
-def compute_risk(governorate, city_area, ptype, price):
-    gov = str(governorate).lower()
-    area = str(city_area).lower()
-    t = str(ptype).lower()
 
-    if any(k in area for k in ["coast", "sokhna", "gouna", "sahel", "marassi"]):
-        return 3
-    if price > 15_000_000:
-        return 3
-    if "chalet" in t or "cabin" in t:
-        return 3
+def simulate_returns(params, scenarios=SCENARIOS, seed=SIM_SEED, years=HORIZON_YEARS):
+    # params: one (expected_roi, rent yield, rent spread, appreciation
+    # spread) row per listing. Returns P10/P50/P90 of the total return over
+    # `years` per listing. Every listing sees the same seeded scenarios, so
+    # listings with equal parameters share one simulation and results do
+    # not depend on how the rows are partitioned.
+    rng = np.random.default_rng(seed)
+    z_rent = rng.standard_normal((years, scenarios))
+    z_growth = rng.standard_normal((years, scenarios))
 
-    if "cairo" in gov and ("new cairo" in area or "5" in area or "zayed" in area or "october" in area):
-        return 1
-    if price < 3_000_000 and "apartment" in t:
-        return 1
+    unique, inverse = np.unique(params, axis=0, return_inverse=True)
+    out = np.empty((len(unique), 3))
+    step = max(1, SIM_CELLS // scenarios)
+    for a in range(0, len(unique), step):
+        roi, rent, rent_sd, growth_sd = (unique[a:a + step, i:i + 1] for i in range(4))
+        value = np.ones((len(roi), scenarios))
+        income = np.zeros((len(roi), scenarios))
+        for t in range(years):
+            income += np.maximum(rent + rent_sd * z_rent[t], 0.0) * value
+            value *= np.maximum(1.0 + (roi - rent) + growth_sd * z_growth[t], 0.0)
+        out[a:a + step] = np.percentile(value + income - 1.0, [10, 50, 90], axis=1).T
+    return out[inverse.ravel()]
 
-    return 2
 
+def score_frame(df, scenarios=SCENARIOS, seed=SIM_SEED):
+    ctx = RuleContext(df)
 
-def main():
-    print("Loading cleaned data...")
-    df = pd.read_csv(CLEANED)
+    roi = ctx.evaluate(ROI_TABLES[0])
+    for table in ROI_TABLES[1:]:
+        roi = roi + ctx.evaluate(table)
+    df["expected_roi"] = np.clip(roi, *ROI_RANGE)
 
-    print("Computing ROI...")
-    base_roi = df.apply(lambda r: roi_from_location(r["governorate"], r["city_area"]), axis=1)
-    roi1 = [adjust_roi_property_type(br, t) for br, t in zip(base_roi, df["property_type"])]
-    roi2 = [adjust_roi_price(r, p) for r, p in zip(roi1, df["price_egp"])]
-    final_roi = [adjust_roi_payment(r, d) for r, d in zip(roi2, df["down_payment_egp"])]
+    df["base_risk"] = ctx.evaluate(RISK_TABLE)
 
-    df["expected_roi"] = np.clip(final_roi, 0.05, 0.22)
+    if scenarios and len(df):
+        with metrics.span("features.simulate"):
+            params = np.column_stack([
+                df["expected_roi"].to_numpy(dtype=float), ctx.evaluate(RENT_YIELD_TABLE),
+                ctx.evaluate(RENT_SPREAD_TABLE), ctx.evaluate(APPRECIATION_SPREAD_TABLE),
+            ])
+            returns = simulate_returns(params, scenarios, seed)
+        for i, column in enumerate(RETURN_COLUMNS):
+            df[column] = returns[:, i]
+    return df
 
-    print("Computing risk...")
-    df["base_risk"] = df.apply(
-        lambda r: compute_risk(r["governorate"], r["city_area"], r["property_type"], r["price_egp"]),
-        axis=1
-    )
 
-    print("Selecting final columns...")
-    df_final = pd.DataFrame({
+def select_final(df):
+    final = pd.DataFrame({
         "name": df["project_name"].fillna("Property"),
         "city": df["city_area"].fillna(df["governorate"]),
         "property_type": df["property_type"],
@@ -103,12 +201,58 @@ def main():
         "base_risk": df["base_risk"],
         "url": df["url"]  # KEEP URL
     })
+    # Size and bedrooms come along when cleaning parsed them; the similar
+    # listings search uses them.
+    if "size_sqm" in df:
+        final["size_sqm"] = df["size_sqm"]
+    if "bedrooms_clean" in df:
+        final["bedrooms"] = df["bedrooms_clean"]
+    for column in RETURN_COLUMNS:
+        if column in df:
+            final[column] = df[column]
+    if "is_outlier" in df:
+        final["is_outlier"] = df["is_outlier"]
+    return final
 
-    print("Saving final dataset to properties.xlsx ...")
-    df_final.to_excel(OUTFILE, index=False)
+
+def main(cleaned=CLEANED, outfile=OUTFILE, workers=1, skip_excel=False, scenarios=SCENARIOS, seed=SIM_SEED):
+    print("Loading cleaned data...")
+    with metrics.span("features.load"):
+        df = pd.read_csv(cleaned)
+
+    print("Computing ROI and risk...")
+    with metrics.span("features.score"):
+        df = map_partitions(partial(score_frame, scenarios=scenarios, seed=seed), df, workers)
+
+    print("Selecting final columns...")
+    df_final = select_final(df)
+
+    if not skip_excel:
+        print(f"Saving final dataset to {outfile} ...")
+        with metrics.span("features.excel"):
+            df_final.to_excel(outfile, index=False)
+
+    print("Writing binary snapshot for fast loading ...")
+    with metrics.span("features.snapshot"):
+        write_snapshot(df_final, outfile)
     print("DONE ✔")
     print("Final shape:", df_final.shape)
+    return len(df_final)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score cleaned listings and export properties.xlsx.")
+    parser.add_argument("--cleaned", default=CLEANED)
+    parser.add_argument("--outfile", default=OUTFILE)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="score row ranges in this many worker processes")
+    parser.add_argument("--skip-excel", action="store_true",
+                        help="only write the binary snapshot, not the .xlsx")
+    parser.add_argument("--scenarios", type=int, default=SCENARIOS,
+                        help=f"Monte Carlo scenarios for the {HORIZON_YEARS}-year return percentiles (0 skips them)")
+    parser.add_argument("--seed", type=int, default=SIM_SEED)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    main(**vars(parse_args()))
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Mergeable streaming quantile sketches over positive values. Bucket i holds
+# values in (GAMMA**(i-1), GAMMA**i], so any quantile read back is within
+# ALPHA relative error of a true sample quantile. Sketches built from
+# separate chunks or worker processes merge exactly by adding their counts,
+# and memory is fixed no matter how many values go in.
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LOW, HIGH = 1e-3, 1e12  # values outside this range are clamped into it
+
+_LOG_GAMMA = np.log(GAMMA)
+_FIRST = int(np.ceil(np.log(LOW) / _LOG_GAMMA))
+N_BUCKETS = int(np.ceil(np.log(HIGH) / _LOG_GAMMA)) - _FIRST + 1
+
+
+def bucket_of(values):
+    # Bucket numbers for positive finite values.
+    values = np.clip(values, LOW, HIGH)
+    return np.ceil(np.log(values) / _LOG_GAMMA).astype(np.int64) - _FIRST
+
+
+class QuantileSketch:
+    def __init__(self, counts=None):
+        self.counts = np.zeros(N_BUCKETS, dtype=np.int64) if counts is None else counts
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values) & (values > 0)]
+        self.counts += np.bincount(bucket_of(values), minlength=N_BUCKETS)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q):
+        cumulative = np.cumsum(self.counts)
+        if not cumulative[-1]:
+            return np.nan
+        i = int(np.searchsorted(cumulative, q * (cumulative[-1] - 1), side="right"))
+        return 2 * GAMMA ** (i + _FIRST) / (GAMMA + 1)
+
+
+class GroupedSketches:
+    # One QuantileSketch per group key, filled a chunk at a time.
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, codes, keys, values):
+        # codes[i] indexes keys for row i (-1 skips the row), as
+        # pd.factorize returns them.
+        values = np.asarray(values, dtype=np.float64)
+        ok = (codes >= 0) & np.isfinite(values) & (values > 0)
+        flat = codes[ok].astype(np.int64) * N_BUCKETS + bucket_of(values[ok])
+        counts = np.bincount(flat, minlength=len(keys) * N_BUCKETS).reshape(len(keys), N_BUCKETS)
+        for code in np.flatnonzero(counts.any(axis=1)):
+            sketch = self.groups.setdefault(keys[code], QuantileSketch())
+            sketch.counts += counts[code]
+        return self
+
+    def merge(self, other):
+        for key, sketch in other.groups.items():
+            self.groups.setdefault(key, QuantileSketch()).merge(sketch)
+        return self
+
+    def combined(self):
+        total = QuantileSketch()
+        for sketch in self.groups.values():
+            total.merge(sketch)
+        return total
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from agent import PREFS_DB, AgentPreferences
+from data import column_choices, load_properties
+from model import recommend_batch
+from preference_store import open_store
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Same override weights the chat commands use.
+MODES = {
+    "roi": {"w_roi": 0.85, "w_risk": 0.10, "w_budget": 0.05},
+    "risk": {"w_roi": 0.10, "w_risk": 0.85, "w_budget": 0.05},
+    "price": {"w_roi": 0.10, "w_risk": 0.05, "w_budget": 0.85},
+}
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _Weights:
+    def __init__(self, w):
+        self.w_roi, self.w_risk, self.w_budget = w["w_roi"], w["w_risk"], w["w_budget"]
+
+
+class RecommendationService:
+    # Holds the dataset and preference store for the life of the server.
+    # Recommend calls that arrive within `window_ms` of each other are
+    # scored together by one recommend_batch call; scoring and preference
+    # writes share a single worker thread, so they never interleave.
+    def __init__(self, df, store, window_ms=5.0, max_batch=256):
+        self.df = df
+        self.store = store
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.users = {}
+        self.pending = []
+        self.timer = None
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.stats = {"requests": 0, "batches": 0, "batched_queries": 0, "updates": 0}
+
+        self.cities = column_choices(df, "city")
+        self.types = column_choices(df, "property_type")
+
+    def prefs(self, user_id):
+        prefs = self.users.get(user_id)
+        if prefs is None:
+            prefs = self.users[user_id] = AgentPreferences(user_id, store=self.store)
+        return prefs
+
+    async def recommend(self, user_id, budget, city, ptype, k, offset, mode):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(((user_id, budget, city, ptype, k, offset, mode), future))
+
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._score(batch))
+
+    async def _score(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.worker, self._score_batch, [q for q, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _score_batch(self, requests):
+        queries, weights = [], {}
+        for user_id, budget, city, ptype, k, offset, mode in requests:
+            key = (user_id, mode)
+            if key not in weights:
+                weights[key] = _Weights(MODES[mode]) if mode else self.prefs(user_id)
+            queries.append((key, budget, city, ptype))
+
+        depth = max(k + offset for _, _, _, _, k, offset, _ in requests)
+        with metrics.span("server.batch"):
+            try:
+                ranked = recommend_batch(self.df, queries, weights, k=depth)
+            except Exception:
+                # Score the queries one by one so only the failing ones fail.
+                ranked = [self._score_one(query, weights, depth) for query in queries]
+
+        self.stats["batches"] += 1
+        self.stats["batched_queries"] += len(requests)
+        metrics.observe("server.batch_size", len(requests))
+        return [r if isinstance(r, Exception) else r[offset:offset + k]
+                for r, (_, _, _, _, k, offset, _) in zip(ranked, requests)]
+
+    def _score_one(self, query, weights, depth):
+        try:
+            return recommend_batch(self.df, [query], weights, k=depth)[0]
+        except Exception as e:
+            return e
+
+    async def update(self, kind, user_id, body):
+        budget = _budget(body.get("budget"))
+        if kind == "choice":
+            prop = _listing(_require(body, "property"), "property")
+        else:
+            props = body.get("properties") or []
+            if not isinstance(props, list):
+                raise HTTPError(400, "properties must be a list")
+            props = [_listing(p, f"properties[{i}]") for i, p in enumerate(props)]
+
+        def apply():
+            prefs = self.prefs(user_id)
+            if kind == "choice":
+                prefs.update_from_choice(prop, budget)
+            else:
+                prefs.update_from_rejection(props, budget)
+            self.stats["updates"] += 1
+            return _weights(prefs)
+
+        return await asyncio.get_running_loop().run_in_executor(self.worker, apply)
+
+    async def handle(self, method, path, body):
+        if path == "/health":
+            return {"status": "ok", "listings": len(self.df)}
+        if path == "/meta":
+            return {"cities": self.cities, "types": self.types, "modes": sorted(MODES)}
+        if path == "/stats":
+            stats = dict(self.stats)
+            stats["mean_batch_size"] = round(stats["batched_queries"] / max(stats["batches"], 1), 2)
+            if metrics.enabled():
+                stats["metrics"] = metrics.snapshot()
+            return stats
+
+        if method != "POST":
+            raise HTTPError(405, f"{path} expects POST")
+        user_id = _text(_require(body, "user_id"), "user_id").strip().lower()
+
+        if path == "/recommend":
+            mode = body.get("mode")
+            if mode is not None and (not isinstance(mode, str) or mode not in MODES):
+                raise HTTPError(400, f"mode must be one of {sorted(MODES)}")
+            k = _positive_int(body.get("k", 3), "k")
+            offset = _positive_int(body.get("offset", 0), "offset", allow_zero=True)
+            city = _text(body.get("city"), "city") or "Any"
+            ptype = _text(body.get("type"), "type") or _text(body.get("ptype"), "ptype") or "Any"
+            results = await self.recommend(user_id, _budget(body.get("budget")), city, ptype, k, offset, mode)
+            return {"results": results}
+        if path == "/choice":
+            return {"weights": await self.update("choice", user_id, body)}
+        if path == "/rejection":
+            return {"weights": await self.update("rejection", user_id, body)}
+        raise HTTPError(404, f"no route for {path}")
+
+
+def _require(body, field):
+    if field not in body:
+        raise HTTPError(400, f"missing field {field!r}")
+    return body[field]
+
+
+def _text(value, name):
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise HTTPError(400, f"{name} must be a string")
+    return value
+
+
+def _listing(value, name):
+    # A result as /recommend returned it; only the fields the preference
+    # update reads are checked.
+    if not isinstance(value, dict):
+        raise HTTPError(400, f"{name} must be an object")
+    for field in ("roi", "price"):
+        if field in value and (isinstance(value[field], bool) or not isinstance(value[field], (int, float))):
+            raise HTTPError(400, f"{name}.{field} must be a number")
+    if "risk_text" in value and not isinstance(value["risk_text"], str):
+        raise HTTPError(400, f"{name}.risk_text must be a string")
+    return value
+
+
+def _budget(value):
+    if value in (None, ""):
+        return None
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "budget must be a number")
+    return budget if budget > 0 else None
+
+
+def _positive_int(value, name, allow_zero=False):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be an integer")
+    if n < 0 or (n == 0 and not allow_zero):
+        raise HTTPError(400, f"{name} out of range")
+    return min(n, 1000)
+
+
+def _weights(prefs):
+    return {"w_roi": prefs.w_roi, "w_risk": prefs.w_risk, "w_budget": prefs.w_budget,
+            "interactions": prefs.interactions}
+
+
+async def _read_request(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {STATUS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+def make_handler(service):
+    async def serve_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    method, path, headers, raw = await _read_request(reader)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+                    break
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                started = time.perf_counter()
+                try:
+                    body = json.loads(raw) if raw else {}
+                    if not isinstance(body, dict):
+                        raise HTTPError(400, "body must be a JSON object")
+                    status, payload = 200, await service.handle(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except json.JSONDecodeError:
+                    status, payload = 400, {"error": "body is not valid JSON"}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                service.stats["requests"] += 1
+                metrics.observe(f"server{path}", (time.perf_counter() - started) * 1000)
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    return serve_connection
+
+
+async def serve(service, host=HOST, port=PORT):
+    server = await asyncio.start_server(make_handler(service), host, port)
+    print(f"Serving {len(service.df):,} listings on http://{host}:{port} "
+          f"(batch window {service.window * 1000:g} ms, max batch {service.max_batch})")
+    async with server:
+        await server.serve_forever()
+
+
+def main(properties="properties.xlsx", prefs_path=PREFS_DB, host=HOST, port=PORT, window_ms=5.0, max_batch=256):
+    df = load_properties(properties)
+    service = RecommendationService(df, open_store(prefs_path), window_ms, max_batch)
+    try:
+        asyncio.run(serve(service, host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.worker.shutdown()
+        service.store.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP recommendation service with request micro-batching.")
+    parser.add_argument("--properties", default="properties.xlsx")
+    parser.add_argument("--prefs-path", default=PREFS_DB)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--window-ms", type=float, default=5.0,
+                        help="how long to hold a recommend request for others to batch with")
+    parser.add_argument("--max-batch", type=int, default=256)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(**vars(parse_args()))
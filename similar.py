@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+import metrics
+from model import get_index
+
+# "More like this": nearest listings to a chosen one. Every rankable listing
+# is a point of z-scored log price, ROI and risk, plus log size and bedrooms
+# when the dataset carries them; a different city or property type adds a
+# fixed penalty to the squared distance. Points are stored grouped by
+# (city, type) bucket, so a query scans its own bucket first and only visits
+# other buckets while their penalty can still beat the k-th best distance.
+CITY_PENALTY = 1.0
+TYPE_PENALTY = 1.0
+BLOCK_ROWS = 1 << 16  # rows per distance block
+
+OPTIONAL = ("size_sqm", "bedrooms")
+
+
+def _zscore(x):
+    # Missing values sit at the median, so they neither attract nor repel.
+    x = np.asarray(x, dtype=np.float64)
+    finite = np.isfinite(x)
+    x = np.where(finite, x, np.median(x[finite]) if finite.any() else 0.0)
+    std = x.std()
+    return (x - x.mean()) / std if std > 0 else np.zeros_like(x)
+
+
+class SimilarIndex:
+    def __init__(self, df, index):
+        self.n_types = index.n_types
+        v = index.valid_pos
+
+        columns = [np.log(np.maximum(index.price[v], 1.0)), index.roi[v], index.risk[v]]
+        for name in OPTIONAL:
+            if name in df.columns:
+                x = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)[v]
+                columns.append(np.log1p(np.maximum(x, 0.0)) if name == "size_sqm" else x)
+
+        bucket = index.city_codes[v].astype(np.int64) * self.n_types + index.type_codes[v]
+        order = np.argsort(bucket, kind="stable")
+        self.rows = v[order]
+        self.features = np.empty((len(order), len(columns)), dtype=np.float32)
+        for j in range(len(columns)):
+            self.features[:, j] = _zscore(columns[j])[order]
+            columns[j] = None  # one float64 column at a time
+
+        codes, starts = np.unique(bucket[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        self.spans = {int(c): (int(a), int(b)) for c, a, b in zip(codes, starts, ends)}
+
+    def _groups(self, own):
+        # Buckets by penalty: own bucket, same city, same type, the rest.
+        city, ptype = divmod(own, self.n_types)
+        groups = {0.0: [own]}
+        for code in self.spans:
+            if code == own:
+                continue
+            c, t = divmod(code, self.n_types)
+            penalty = (CITY_PENALTY if c != city else 0.0) + (TYPE_PENALTY if t != ptype else 0.0)
+            groups.setdefault(penalty, []).append(code)
+        return sorted(groups.items())
+
+    def nearest(self, index, row, k=5):
+        # Rows of the k listings closest to `row`, nearest first (ties in
+        # dataset order); empty when `row` is not a rankable listing.
+        own = int(index.city_codes[row]) * self.n_types + int(index.type_codes[row])
+        a, b = self.spans.get(own, (0, 0))
+        j = a + int(np.searchsorted(self.rows[a:b], row))
+        if j >= b or self.rows[j] != row:
+            return []
+        query = self.features[j]
+
+        best_d = np.empty(0, dtype=np.float32)
+        best_r = np.empty(0, dtype=np.int64)
+        for penalty, codes in self._groups(own):
+            if len(best_d) >= k and penalty > best_d[-1]:
+                break
+            for code in codes:
+                a, b = self.spans[code]
+                for start in range(a, b, BLOCK_ROWS):
+                    end = min(b, start + BLOCK_ROWS)
+                    d = ((self.features[start:end] - query) ** 2).sum(axis=1) + np.float32(penalty)
+                    r = self.rows[start:end]
+                    metrics.count("similar.rows_scanned", end - start)
+
+                    d = np.concatenate([best_d, d[r != row]])
+                    r = np.concatenate([best_r, r[r != row]])
+                    if len(d) > k:
+                        keep = d <= np.partition(d, k - 1)[k - 1]
+                        d, r = d[keep], r[keep]
+                    order = np.lexsort((r, d))[:k]
+                    best_d, best_r = d[order], r[order]
+        return [int(r) for r in best_r]
+
+    def nbytes(self):
+        return self.rows.nbytes + self.features.nbytes
+
+
+def build_similar(df):
+    index = get_index(df)
+    index.similar = SimilarIndex(df, index)
+    return index.similar
+
+def similar_listings(df, row, k=5):
+    # Result dicts (as recommend() returns them) for the k listings most
+    # like the one at position `row`.
+    with metrics.span("similar"):
+        index = get_index(df)
+        if index.similar is None:
+            build_similar(df)
+        return [index.result(r) for r in index.similar.nearest(index, row, k)]
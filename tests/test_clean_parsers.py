@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clean_data  # noqa: E402
+
+# Raw cells as they show up in the scrape, plus numeric cells (what
+# read_csv gives for an all-number column), Arabic-Indic digits and NaN.
+PRICES = ["1,250,000", "EGP 3,400,000", "2,000,000 EGP", "Ask for price", "١٢٥٠٠٠٠", "750000.5",
+          "", "  ", 4500000, 4500000.0, np.nan, None]
+SIZES = ["1,615 sqft / 150 sqm", "150 sqm", "1615 sqft", "1,615 sqft", "١٥٠ sqm", "95.5 SQM",
+         "120", "", 150, 150.0, np.nan, None]
+BEDROOMS = ["studio", "Studio", "1", "3+ maid", "4+ Maid", "7+", "maid", "٣", " 2 ", "",
+            3, 3.0, np.nan, None]
+BATHROOMS = ["1", "2", "none", "None", "7+", "2.5", "3.4", "٢", "", "n/a", 2, 4.0, np.nan, None]
+
+
+def _column(values):
+    # The same cells repeated and shuffled, so distinct-value caching is
+    # exercised the way a real column would.
+    rng = np.random.default_rng(0)
+    return pd.Series(np.asarray(values * 5, dtype=object)[rng.permutation(len(values) * 5)],
+                     index=np.arange(len(values) * 5) + 100)
+
+
+def _same(actual, expected):
+    actual = pd.Series(actual)
+    expected = pd.Series(list(expected), index=actual.index)
+    np.testing.assert_array_equal(actual.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize("values", [PRICES, SIZES])
+def test_egp_amount_column(values):
+    col = _column(values)
+    _same(clean_data.parse_egp_amount_column(col), col.apply(clean_data.parse_egp_amount))
+
+
+def test_size_column():
+    col = _column(SIZES)
+    sqft, sqm = clean_data.parse_size_column(col)
+    expected = col.apply(clean_data.parse_size)
+    _same(sqft, [np.nan if a is None else a for a, _ in expected])
+    _same(sqm, [np.nan if b is None else b for _, b in expected])
+
+
+def test_bedrooms_column():
+    col = _column(BEDROOMS)
+    beds, has_maid = clean_data.parse_bedrooms_column(col)
+    expected = col.apply(clean_data.parse_bedrooms)
+    _same(beds, [b for b, _ in expected])
+    assert has_maid.tolist() == [m for _, m in expected]
+
+
+def test_bathrooms_column():
+    col = _column(BATHROOMS)
+    _same(clean_data.parse_bathrooms_column(col), col.apply(clean_data.parse_bathrooms))
+
+
+def test_integer_columns_match_apply_dtype():
+    # Without missing cells, apply() gives an int64 column; so must the
+    # column-wide parsers.
+    col = pd.Series(["1", "2", "3+ maid", "studio"])
+    beds, _ = clean_data.parse_bedrooms_column(col)
+    assert beds.dtype == col.apply(lambda s: clean_data.parse_bedrooms(s)[0]).dtype
+    col = pd.Series(["1", "2", "none", "7+"])
+    assert clean_data.parse_bathrooms_column(col).dtype == col.apply(clean_data.parse_bathrooms).dtype
+
+
+def test_index_is_kept():
+    col = _column(PRICES)
+    assert clean_data.parse_egp_amount_column(col).index.equals(col.index)
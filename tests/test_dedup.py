@@ -0,0 +1,166 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clean_data  # noqa: E402
+import dedup  # noqa: E402
+from benchmarks.generate import make_raw  # noqa: E402
+
+PROJECTS = [("Mivida", "5th Settlement Compounds", "New Cairo City", "Cairo"),
+            ("Marassi", "Sidi Abdel Rahman", "Sidi Abdel Rahman", "North Coast"),
+            ("Palm Hills", "Sheikh Zayed City", "Sheikh Zayed City", "Giza"),
+            ("Hacienda Bay", "Sidi Abdel Rahman", "Sidi Abdel Rahman", "North Coast")]
+
+
+def listing(i, **fields):
+    # A cleaned row; i picks the project and spreads prices and sizes.
+    project, neighbourhood, area, governorate = PROJECTS[i % len(PROJECTS)]
+    row = {"url": f"u{i}", "project_name": project, "neighbourhood": neighbourhood, "city_area": area,
+           "governorate": governorate, "property_type": "apartment", "price_egp": 2_000_000.0 * 1.1 ** i,
+           "size_sqm": 100.0 + 7 * i, "bedrooms_clean": 3.0, "bathrooms_clean": 2.0,
+           "down_payment_egp": 300_000.0, "available_from_date": pd.Timestamp("2025-06-30")}
+    row.update(fields)
+    return row
+
+
+def kept(rows):
+    df = pd.DataFrame(rows)
+    return df["url"][~clean_data.duplicate_rows(df)].tolist()
+
+
+def repost(row, url, **fields):
+    # The same unit listed again with less filled in.
+    return {**row, "url": url, "down_payment_egp": np.nan, **fields}
+
+
+@pytest.mark.parametrize("edit", [
+    {},
+    {"project_name": "MIVIDA"},
+    {"project_name": "Mivida."},
+    {"project_name": "Mivda"},
+    {"project_name": "Mivixda"},
+    {"neighbourhood": "5th  Settlement-Compounds"},
+    {"price_egp": 2_000_000.0 * 1.015},
+    {"price_egp": 2_000_000.0 * 0.985},
+    {"size_sqm": 100.9},
+    {"available_from_date": pd.NaT},
+    {"bedrooms_clean": np.nan, "size_sqm": np.nan},
+])
+def test_reposts_with_small_edits_are_dropped(edit):
+    base = [listing(i) for i in range(12)]
+    rows = base + [repost(base[0], "d0", **edit)]
+    if "bedrooms_clean" in edit:
+        # Reposts without rooms or size only match each other.
+        rows = base + [repost(base[0], "d0", **edit), repost(base[0], "d1", **edit)]
+        assert kept(rows) == [r["url"] for r in base] + ["d0"]
+    else:
+        assert kept(rows) == [r["url"] for r in base]
+
+
+def test_most_complete_copy_is_kept():
+    first = repost(listing(0), "first")
+    rows = [first, listing(0, url="full"), repost(listing(0), "later")]
+    assert kept(rows) == ["full"]
+    assert kept([first, repost(listing(0), "later")]) == ["first"]
+
+
+@pytest.mark.parametrize("change", [
+    {"size_sqm": 102.0},
+    {"price_egp": 2_000_000.0 * 1.03},
+    {"price_egp": 2_000_000.0 / 1.03},
+    {"bedrooms_clean": 2.0},
+    {"bathrooms_clean": 3.0},
+    {"available_from_date": pd.Timestamp("2025-12-31")},
+    {"city_area": "New Capital City"},
+    {"property_type": "duplex"},
+    {"project_name": "Mountain View", "neighbourhood": "Hyde Park"},
+])
+def test_distinct_units_are_kept(change):
+    rows = [listing(0), listing(0, url="other", **change)]
+    assert kept(rows) == ["u0", "other"]
+
+
+def test_copies_meet_across_rows_sorted_between_them():
+    # Units of one project, all in one price bucket and sizes between the
+    # two copies', differing only by their dates, so they sort between the
+    # copies without matching them.
+    dates = pd.date_range("2024-01-01", periods=dedup.WINDOW - 2, freq="7D")
+    units = [listing(0, url=f"unit{i}", size_sqm=100.0 + i / 50, available_from_date=d)
+             for i, d in enumerate(dates)]
+    moved_in = pd.Timestamp("2023-06-01")
+    copies = [listing(0, url="a", size_sqm=100.0, available_from_date=moved_in),
+              repost(listing(0), "b", size_sqm=100.8, available_from_date=moved_in, project_name="Mivda")]
+    result = kept(units + copies)
+    assert "b" not in result
+    assert len(result) == len(units) + 1
+
+
+def test_find_duplicates_on_empty_input():
+    empty = np.zeros(0)
+    drop = dedup.find_duplicates(empty.astype(np.uint64), empty, empty, empty.astype(int), empty, empty,
+                                 dedup.TextSignatures().matrix(), 0.02, 0.01, 0.6)
+    assert drop.shape == (0,)
+
+
+def test_unrelated_synthetic_listings_are_kept():
+    # Generated listings without reposts: distinct units of one project
+    # with close sizes and prices must almost all survive.
+    raw = make_raw(5000, seed=2)
+    raw["url"] = [f"u{i}" for i in range(len(raw))]
+    df = clean_data.clean_frame(raw, log=lambda message: None).reset_index(drop=True)
+    before = clean_data.duplicate_rows(df).sum()
+    assert before / len(df) < 0.04  # the generator's own reposts
+
+    rng = np.random.default_rng(0)
+    src = rng.choice(len(df), 200, replace=False)
+    dups = df.iloc[src].copy()
+    dups["url"] = "d" + dups["url"].str[1:]
+    dups["price_egp"] = np.round(dups["price_egp"] * rng.uniform(0.99, 1.01, len(dups)), -3)
+    dups["project_name"] = dups["project_name"].str.upper()
+    dups["down_payment_egp"] = np.nan
+    both = pd.concat([df, dups], ignore_index=True).sample(frac=1, random_state=1)
+    drop = clean_data.duplicate_rows(both)
+    gone = set(both["url"][drop])
+    assert all(f"d{i}" in gone or f"u{i}" in gone for i in dups["url"].str[1:])
+    assert drop.sum() - len(dups) <= before + 2
+
+
+RAW = ["url,type,price,location,bedrooms,bathrooms,size,available_from,down_payment",
+       "u1,Apartment,\"2,000,000\",\"Mivida, New Cairo City, Cairo\",3,2,150 sqm,,",
+       "u2,Villa,\"9,000,000\",\"Marassi, Sidi Abdel Rahman, North Coast\",,3,400 sqm,,",
+       "u3,Apartment,\"2,010,000\",\"MIVIDA, New Cairo City, Cairo\",3,2,150 sqm,,",
+       "u4,Apartment,\"3,000,000\",\"Zamalek, Cairo\",2,1,120 sqm,,"]
+
+
+def _clean(raw_csv, tmp_path, name, **options):
+    # The rows kept, in order, and their outlier flags.
+    out_csv = str(tmp_path / f"{name}.csv")
+    clean_data.main(raw_csv, out_csv, report_csv=str(tmp_path / f"{name}_report.csv"), **options)
+    return pd.read_csv(out_csv, usecols=["url", "is_outlier"], dtype=str, keep_default_na=False)
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3])
+def test_streamed_dedup_matches_in_memory_across_chunks(tmp_path, chunksize):
+    # Chunks with a missing bedroom count parse the column as float, the
+    # others as int; the repost of u1 sits in another chunk.
+    raw_csv = tmp_path / "raw.csv"
+    raw_csv.write_text("\n".join(RAW) + "\n")
+    full = _clean(str(raw_csv), tmp_path, "full")
+    assert full["url"].tolist() == ["u1", "u2", "u4"]
+    streamed = _clean(str(raw_csv), tmp_path, "streamed", chunksize=chunksize)
+    pd.testing.assert_frame_equal(streamed, full)
+
+
+@pytest.mark.parametrize("options", [{"chunksize": 333}, {"chunksize": 1000, "workers": 2}])
+def test_streamed_dedup_matches_in_memory(tmp_path, options):
+    raw_csv = str(tmp_path / "raw.csv")
+    make_raw(3000, seed=6).to_csv(raw_csv, index=False)
+    full = _clean(raw_csv, tmp_path, "full")
+    streamed = _clean(raw_csv, tmp_path, "streamed", **options)
+    assert len(full) < 3000
+    pd.testing.assert_frame_equal(streamed, full)
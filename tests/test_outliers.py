@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clean_data  # noqa: E402
+from benchmarks.generate import make_raw  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def raw_csv(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("raw") / "raw.csv")
+    make_raw(3000, seed=5).to_csv(path, index=False)
+    return path
+
+
+def _clean(raw_csv, out_dir, name, **options):
+    out_csv = os.path.join(out_dir, f"{name}.csv")
+    report_csv = os.path.join(out_dir, f"{name}_report.csv")
+    clean_data.main(raw_csv, out_csv, report_csv=report_csv, dedup=False, **options)
+    return (pd.read_csv(out_csv, dtype=str, keep_default_na=False),
+            pd.read_csv(report_csv, dtype=str, keep_default_na=False))
+
+
+@pytest.fixture(scope="module")
+def in_memory(raw_csv, tmp_path_factory):
+    return _clean(raw_csv, str(tmp_path_factory.mktemp("full")), "full")
+
+
+@pytest.mark.parametrize("options", [{"chunksize": 97}, {"chunksize": 1000, "workers": 2}])
+def test_streamed_flags_match_in_memory(raw_csv, in_memory, tmp_path, options):
+    full, full_report = in_memory
+    streamed, streamed_report = _clean(raw_csv, str(tmp_path), "streamed", **options)
+    assert full["url"].tolist() == streamed["url"].tolist()
+    assert full["is_outlier"].tolist() == streamed["is_outlier"].tolist()
+    pd.testing.assert_frame_equal(full_report, streamed_report)
+
+
+def test_mistyped_prices_are_flagged(raw_csv):
+    df = clean_data.clean_frame(pd.read_csv(raw_csv), log=lambda message: None)
+    per_sqm = clean_data.price_per_sqm(df)
+    fences = clean_data.outlier_fences(clean_data.outlier_sketches(df))
+    flagged, counts = clean_data.flag_outliers(df, fences)
+
+    # Prices a hundred times or a thousandth of their group's median.
+    groups = df[list(clean_data.OUTLIER_GROUP)].apply(lambda c: c.str.strip().str.lower())
+    ratio = per_sqm / pd.Series(per_sqm).groupby([groups[c] for c in groups]).transform("median").to_numpy()
+    typos = (ratio > 30) | (ratio < 1 / 30)
+    assert typos.sum() >= 5
+    assert flagged[typos].all()
+    assert flagged[~typos].mean() < 0.002
+    assert sum(counts.values()) == flagged.sum()
+    assert not flagged[~np.isfinite(per_sqm)].any()
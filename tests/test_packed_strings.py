@@ -0,0 +1,177 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.tests.extension import base
+from pandas.tests.extension.conftest import *  # noqa: F401,F403  (pandas' shared fixtures)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import compact_properties, read_snapshot, write_snapshot  # noqa: E402
+from packed_strings import PackedStringArray, PackedStringDtype  # noqa: E402
+
+PREFIX = "https://example.com/listing/"
+
+
+def _packed(values):
+    return PackedStringArray.from_strings([v if pd.isna(v) else PREFIX + v for v in values])
+
+
+@pytest.fixture
+def dtype():
+    return PackedStringDtype()
+
+
+@pytest.fixture
+def data():
+    return _packed([f"{i:03d}-apartment" for i in range(10)])
+
+
+@pytest.fixture
+def data_missing():
+    return _packed([np.nan, "a"])
+
+
+@pytest.fixture
+def data_for_sorting():
+    return _packed(["b", "c", "a"])
+
+
+@pytest.fixture
+def data_missing_for_sorting():
+    return _packed(["b", np.nan, "a"])
+
+
+@pytest.fixture
+def data_for_grouping():
+    return _packed(["b", "b", np.nan, np.nan, "a", "a", "b", "c"])
+
+
+@pytest.fixture
+def na_cmp():
+    return lambda a, b: pd.isna(a) and pd.isna(b)
+
+
+# Two more of pandas' own fixtures, from its top-level conftest.
+@pytest.fixture(params=[None, lambda x: x])
+def sort_by_key(request):
+    return request.param
+
+
+@pytest.fixture(params=[True, False])
+def using_nan_is_na(request):
+    with pd.option_context("future.distinguish_nan_and_na", not request.param):
+        yield request.param
+
+
+# pandas' conformance suite for extension arrays, minus the arithmetic,
+# reduction and accumulation parts, which text does not support.
+class TestDtype(base.BaseDtypeTests):
+    pass
+
+
+class TestConstructors(base.BaseConstructorsTests):
+    pass
+
+
+class TestInterface(base.BaseInterfaceTests):
+    pass
+
+
+class TestGetitem(base.BaseGetitemTests):
+    pass
+
+
+class TestSetitem(base.BaseSetitemTests):
+    pass
+
+
+class TestMissing(base.BaseMissingTests):
+    pass
+
+
+class TestMethods(base.BaseMethodsTests):
+    pass
+
+
+class TestCasting(base.BaseCastingTests):
+    pass
+
+
+class TestReshaping(base.BaseReshapingTests):
+    pass
+
+
+class TestGroupby(base.BaseGroupbyTests):
+    pass
+
+
+class TestPrinting(base.BasePrintingTests):
+    pass
+
+
+class TestParsing(base.BaseParsingTests):
+    pass
+
+
+class TestIndex(base.BaseIndexTests):
+    pass
+
+
+# Everyday column operations give what they give on the plain column.
+@pytest.fixture
+def urls():
+    plain = pd.Series([PREFIX + "1", np.nan, " " + PREFIX + "2 ", "other/3", PREFIX + "1"], dtype=object)
+    return plain, pd.Series(PackedStringArray.from_strings(plain))
+
+
+@pytest.mark.parametrize("op", [
+    lambda s: s.str.strip(),
+    lambda s: s.str.upper(),
+    lambda s: s.str.len(),
+    lambda s: s.str.contains("listing"),
+    lambda s: s.str.startswith(PREFIX),
+    lambda s: s.str.replace("https://", "http://"),
+    lambda s: s.str.split("/").str[-1],
+    lambda s: s.astype(str),
+    lambda s: s.astype(object),
+    lambda s: s.fillna("missing"),
+    lambda s: s.isna(),
+    lambda s: s == PREFIX + "1",
+    lambda s: s.isin([PREFIX + "1"]),
+    lambda s: s.value_counts(dropna=False),
+    lambda s: s.drop_duplicates(),
+])
+def test_matches_plain_column(urls, op):
+    plain, packed = urls
+    expected, result = op(plain), op(packed)
+    assert result.astype(object).tolist() == expected.astype(object).tolist() or \
+        result.fillna("<na>").astype(object).tolist() == expected.fillna("<na>").astype(object).tolist()
+
+
+def test_assignment_and_views(urls):
+    plain, packed = urls
+    packed[0] = PREFIX + "new"
+    packed[packed.isna()] = "no-prefix"
+    plain[0], plain[plain.isna()] = PREFIX + "new", "no-prefix"
+    assert packed.tolist() == plain.tolist()
+    with pytest.raises(TypeError):
+        packed[1] = 5
+
+    array = PackedStringArray.from_strings([PREFIX + "1", PREFIX + "2"])
+    view = array[:1]
+    array[0] = PREFIX + "3"
+    assert view[0] == PREFIX + "3"
+
+
+def test_snapshot_round_trip_stays_writable(tmp_path):
+    df = pd.DataFrame({"url": [PREFIX + "1", np.nan, PREFIX + "22"], "price": [1.0, 2.0, 3.0]})
+    path = str(tmp_path / "p.xlsx")
+    write_snapshot(compact_properties(df), path)
+    loaded = read_snapshot(path)
+    assert isinstance(loaded["url"].dtype, PackedStringDtype)
+    assert loaded["url"].tolist() == df["url"].tolist()
+    loaded.loc[1, "url"] = PREFIX + "3"
+    assert loaded["url"].tolist() == [PREFIX + "1", PREFIX + "3", PREFIX + "22"]
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantile_sketch import ALPHA, HIGH, LOW, GroupedSketches, QuantileSketch  # noqa: E402
+
+QUANTILES = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1]
+
+
+def _samples(kind, n, seed):
+    rng = np.random.default_rng(seed)
+    if kind == "lognormal":
+        return rng.lognormal(10, 1.5, n)
+    if kind == "uniform":
+        return rng.uniform(1, 1000, n)
+    if kind == "pareto":
+        return (rng.pareto(1.1, n) + 1) * 5000
+    if kind == "few":
+        return rng.choice([1500.0, 20_000.0, 20_001.0, 3e6], n)
+    return np.round(rng.normal(25_000, 4000, n).clip(1), -3)
+
+
+@pytest.mark.parametrize("kind", ["lognormal", "uniform", "pareto", "few", "rounded"])
+@pytest.mark.parametrize("n", [1, 2, 7, 1000, 50_000])
+def test_quantiles_within_relative_error(kind, n):
+    values = _samples(kind, n, n)
+    sketch = QuantileSketch().add(values)
+    for q in QUANTILES:
+        # The sample value at rank floor(q * (n - 1)).
+        true = np.quantile(values, q, method="lower")
+        assert abs(sketch.quantile(q) - true) <= ALPHA * true * (1 + 1e-9), (q, true)
+
+
+def test_merged_chunks_equal_one_sketch():
+    values = _samples("lognormal", 30_000, 1)
+    whole = QuantileSketch().add(values)
+    merged = QuantileSketch()
+    for chunk in np.array_split(values, 7):
+        merged.merge(QuantileSketch().add(chunk))
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    assert [merged.quantile(q) for q in QUANTILES] == [whole.quantile(q) for q in QUANTILES]
+
+
+def test_unusable_values_are_skipped_or_clamped():
+    sketch = QuantileSketch().add([np.nan, np.inf, -5.0, 0.0, 100.0])
+    assert sketch.count == 1
+    assert abs(sketch.quantile(0.5) - 100.0) <= ALPHA * 100.0
+    assert np.isnan(QuantileSketch().quantile(0.5))
+
+    clamped = QuantileSketch().add([LOW / 10, HIGH * 10])
+    assert clamped.quantile(0) <= LOW * (1 + ALPHA)
+    assert clamped.quantile(1) >= HIGH * (1 - ALPHA)
+
+
+def test_grouped_sketches_match_one_sketch_per_group():
+    rng = np.random.default_rng(2)
+    keys = ["a", "b", "c"]
+    codes = rng.integers(-1, len(keys), 5000)
+    values = rng.lognormal(8, 1, 5000)
+    values[rng.random(5000) < 0.05] = np.nan
+
+    grouped = GroupedSketches()
+    for part in np.array_split(np.arange(5000), 4):
+        grouped.merge(GroupedSketches().add(codes[part], keys, values[part]))
+    for code, key in enumerate(keys):
+        expected = QuantileSketch().add(values[codes == code])
+        np.testing.assert_array_equal(grouped.groups[key].counts, expected.counts)
+    np.testing.assert_array_equal(grouped.combined().counts, QuantileSketch().add(values[codes >= 0]).counts)
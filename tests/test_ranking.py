@@ -0,0 +1,189 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model  # noqa: E402
+from data import compact_properties  # noqa: E402
+
+CITIES = ["New Cairo", " new cairo ", "Maadi", "Sheikh Zayed", "North Coast"]
+TYPES = ["apartment", "Apartment", "villa", "chalet"]
+# Coarse prices and few distinct ROI / risk values, so rows tie often.
+PRICES = [1_000_000.0, 1_500_000.0, 2_000_000.0, 2_400_000.0, 3_000_000.0, 5_000_000.0]
+ROIS = [0.05, 0.085, 0.095, 0.12, 0.15]
+
+
+class Prefs:
+    def __init__(self, w_roi, w_risk, w_budget):
+        self.w_roi, self.w_risk, self.w_budget = w_roi, w_risk, w_budget
+
+
+def make_frame(n, seed):
+    rng = np.random.default_rng(seed)
+    city = np.array(CITIES, dtype=object)[rng.integers(0, len(CITIES), n)]
+    price = np.array(PRICES)[rng.integers(0, len(PRICES), n)]
+    roi = np.array(ROIS)[rng.integers(0, len(ROIS), n)]
+    risk = rng.integers(1, 4, n).astype(float)
+    # Missing values of every kind, which the ranking skips.
+    city[rng.random(n) < 0.02] = np.nan
+    price[rng.random(n) < 0.02] = np.nan
+    roi[rng.random(n) < 0.02] = np.nan
+    risk[rng.random(n) < 0.02] = np.nan
+    return pd.DataFrame({
+        "name": [f"P{i % 7}" for i in range(n)],
+        "city": city,
+        "property_type": np.array(TYPES, dtype=object)[rng.integers(0, len(TYPES), n)],
+        "price": price,
+        "expected_roi": roi,
+        "base_risk": risk,
+        "url": [f"https://example.com/{i}" for i in range(n)],
+    })
+
+
+def baseline_order(df, budget, city, ptype, prefs):
+    # Row numbers in the order the original per-row model ranked them: its
+    # filters and scores, then a full stable sort (ties in dataset order).
+    def matches(col, wanted):
+        if wanted == "Any":
+            return np.ones(len(df), dtype=bool)
+        return (df[col].astype(str).str.strip().str.lower() == str(wanted).strip().lower()).to_numpy()
+
+    price = pd.to_numeric(df["price"]).to_numpy(dtype=np.float64)
+    roi = pd.to_numeric(df["expected_roi"]).to_numpy(dtype=np.float64)
+    risk = pd.to_numeric(df["base_risk"]).to_numpy(dtype=np.float64)
+    keep = matches("city", city) & matches("property_type", ptype)
+    keep &= np.isfinite(price) & np.isfinite(roi) & np.isfinite(risk)
+    if budget and budget > 0:
+        keep &= price <= float(budget) * 1.2
+    rows = np.flatnonzero(keep)
+    price, roi = price[rows], roi[rows]
+    risk_norm = np.clip((np.trunc(risk[rows]) - 1) / 2.0, 0.0, 1.0)
+    if budget and budget > 0:
+        diff = np.maximum(0.0, np.abs(price - budget) / budget)
+    else:
+        diff = np.zeros(len(rows))
+
+    mode = model._mode(prefs, None)
+    if mode == "roi":
+        keys = (diff, risk_norm, -roi)
+    elif mode == "risk":
+        keys = (diff, -roi, risk_norm)
+    elif mode == "price":
+        keys = (risk_norm, -roi, diff if budget and budget > 0 else price)
+    else:
+        def norm(x):
+            lo, hi = (x.min(), x.max()) if len(x) else (0.0, 0.0)
+            return np.zeros_like(x) if hi <= lo else (x - lo) / (hi - lo)
+        score = (float(prefs.w_roi) * norm(roi) - float(prefs.w_risk) * risk_norm
+                 - float(prefs.w_budget) * norm(diff))
+        keys = (-score,)
+    return rows[np.lexsort((rows, *keys))]
+
+
+def _budgets():
+    # No budget, budgets equal to a listed price, budgets whose 1.2x cap
+    # lands exactly on one, and one below every price.
+    return [None, 0, PRICES[2], PRICES[4], PRICES[3] / 1.2, PRICES[5] / 1.2, 10.0]
+
+
+def _searches():
+    for budget in _budgets():
+        for city in ("Any", "new cairo", "Maadi", "Nowhere"):
+            for ptype in ("Any", "apartment", "VILLA"):
+                yield budget, city, ptype
+
+
+def _with_exact_cap(df):
+    # Listings priced exactly at a budget's 1.2x cap, which must be kept.
+    extra = df.iloc[:4].copy()
+    extra["price"] = [PRICES[3] / 1.2 * 1.2, PRICES[5] / 1.2 * 1.2, PRICES[2], PRICES[2]]
+    extra["url"] = [f"https://example.com/cap{i}" for i in range(len(extra))]
+    return pd.concat([df, extra], ignore_index=True)
+
+
+def _read(results, pattern):
+    # Rows of the results in rank order, read the way a caller would.
+    n = len(results)
+    if pattern == "all":
+        return [r["row"] for r in results[:n]]
+    if pattern == "pages":
+        rows = []
+        for start in range(0, n, 3):
+            rows += [r["row"] for r in results[start:start + 3]]
+        return rows
+    # A short page first, then a jump well past it, then everything.
+    head = [r["row"] for r in results[:2]]
+    if n > 40:
+        assert results[40]["row"] is not None
+    rows = [r["row"] for r in results[:n]]
+    assert rows[:len(head)] == head
+    return rows
+
+
+def check(df, prefs, pattern, compact):
+    frame = compact_properties(df) if compact else df
+    for budget, city, ptype in _searches():
+        model.invalidate_results(frame)
+        results = model.recommend(frame, budget, city, ptype, prefs)
+        expected = baseline_order(frame, budget, city, ptype, prefs).tolist()
+        assert len(results) == len(expected), (budget, city, ptype)
+        assert _read(results, pattern) == expected, (budget, city, ptype)
+
+
+LEARNED = [Prefs(0.4, 0.3, 0.3), Prefs(0.6, 0.1, 0.3), Prefs(0.0, 0.0, 0.0), Prefs(0.2, 0.5, 0.3)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("pattern", ["all", "pages", "jump"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_learned_mode_matches_full_sort(seed, pattern, compact):
+    df = _with_exact_cap(make_frame(300, seed))
+    for prefs in LEARNED:
+        check(df, prefs, pattern, compact)
+
+
+def test_paging_past_growth_steps():
+    # The lazy ranking grows in steps; reading one row at a time far past
+    # the first steps must still follow the full sort.
+    df = make_frame(3000, 7)
+    prefs = LEARNED[0]
+    results = model.recommend(df, PRICES[3], "Any", "Any", prefs)
+    expected = baseline_order(df, PRICES[3], "Any", "Any", prefs).tolist()
+    assert [results[i]["row"] for i in range(300)] == expected[:300]
+    assert [r["row"] for r in results[250:900]] == expected[250:900]
+    assert [r["row"] for r in results] == expected
+
+
+# roi, risk and price modes, served by ListingIndex.ranked from presorted
+# per-bucket orders.
+PRESORTED = [Prefs(0.8, 0.1, 0.1), Prefs(0.1, 0.8, 0.1), Prefs(0.1, 0.1, 0.8)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("pattern", ["all", "pages", "jump"])
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("prefs", PRESORTED, ids=["roi", "risk", "price"])
+def test_presorted_modes_match_full_sort(seed, pattern, compact, prefs):
+    check(_with_exact_cap(make_frame(300, seed)), prefs, pattern, compact)
+
+
+@pytest.mark.parametrize("prefs", PRESORTED, ids=["roi", "risk", "price"])
+def test_presorted_paging_past_first_page(prefs):
+    df = compact_properties(make_frame(3000, 11))
+    results = model.recommend(df, PRICES[2], "Any", "Any", prefs)
+    expected = baseline_order(df, PRICES[2], "Any", "Any", prefs).tolist()
+    assert [results[i]["row"] for i in range(50)] == expected[:50]
+    assert [r["row"] for r in results[40:700]] == expected[40:700]
+    assert [r["row"] for r in results] == expected
+
+
+def test_float32_roi_reads_back_as_stored():
+    df = compact_properties(make_frame(50, 0))
+    assert df["expected_roi"].dtype == np.float32
+    results = model.recommend(df, None, "Any", "Any", LEARNED[0])
+    for r in results:
+        assert r["roi"] in ROIS
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+from preference_store import open_store  # noqa: E402
+
+LISTING = {"name": "P1", "price": 2_000_000.0, "roi": 0.16, "risk_text": "Low"}
+
+
+@pytest.fixture
+def service(tmp_path):
+    n = 40
+    df = pd.DataFrame({
+        "name": [f"P{i}" for i in range(n)],
+        "city": ["New Cairo", "Maadi"] * (n // 2),
+        "property_type": ["apartment", "villa", "chalet", "apartment"] * (n // 4),
+        "price": [1_000_000.0 + 50_000 * i for i in range(n)],
+        "expected_roi": [0.05 + 0.005 * (i % 10) for i in range(n)],
+        "base_risk": [1 + i % 3 for i in range(n)],
+        "url": [f"https://example.com/{i}" for i in range(n)],
+    })
+    service = server.RecommendationService(df, open_store(str(tmp_path / "prefs.db")), window_ms=20)
+    yield service
+    service.worker.shutdown()
+    service.store.close()
+
+
+async def _request(port, method, path, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(raw)}\r\nConnection: close\r\n\r\n".encode() + raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split()[1]), json.loads(body)
+
+
+def call(service, method, path, body):
+    # One request through the real connection handler.
+    raw = body if isinstance(body, bytes) else json.dumps(body).encode()
+
+    async def run():
+        listener = await asyncio.start_server(server.make_handler(service), "127.0.0.1", 0)
+        async with listener:
+            return await _request(listener.sockets[0].getsockname()[1], method, path, raw)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/choice", {"user_id": "a"}),
+    ("/choice", {"user_id": "a", "property": "P1"}),
+    ("/choice", {"user_id": "a", "property": [LISTING]}),
+    ("/choice", {"user_id": "a", "property": None}),
+    ("/choice", {"user_id": "a", "property": {**LISTING, "roi": "high"}}),
+    ("/choice", {"user_id": "a", "property": {**LISTING, "price": None}, "budget": 2_000_000}),
+    ("/choice", {"user_id": "a", "property": {**LISTING, "risk_text": 3}}),
+    ("/choice", {"user_id": "a", "property": LISTING, "budget": "lots"}),
+    ("/rejection", {"user_id": "a", "properties": LISTING}),
+    ("/rejection", {"user_id": "a", "properties": "P1"}),
+    ("/rejection", {"user_id": "a", "properties": [LISTING, "P2"]}),
+    ("/rejection", {"user_id": "a", "properties": [LISTING, {"price": [1]}], "budget": 2_000_000}),
+    ("/recommend", {"user_id": "a", "city": ["Maadi"]}),
+    ("/recommend", {"user_id": "a", "k": "three"}),
+    ("/recommend", {"user_id": "a", "k": 0}),
+    ("/recommend", {"user_id": "a", "mode": "cheap"}),
+    ("/recommend", {"user_id": 7}),
+    ("/recommend", ["user_id", "a"]),
+    ("/recommend", b"{not json"),
+])
+def test_malformed_bodies_are_rejected(service, path, body):
+    status, payload = call(service, "POST", path, body)
+    assert status == 400, payload
+    assert "error" in payload
+    assert service.stats["updates"] == 0
+
+
+def test_malformed_update_leaves_weights_alone(service):
+    before = server._weights(service.prefs("a"))
+    call(service, "POST", "/rejection", {"user_id": "a", "properties": [LISTING, 5], "budget": 2_000_000})
+    assert server._weights(service.prefs("a")) == before
+
+
+def test_valid_updates(service):
+    status, payload = call(service, "POST", "/recommend", {"user_id": "a", "budget": 2_000_000, "k": 2})
+    assert status == 200 and len(payload["results"]) == 2
+
+    status, payload = call(service, "POST", "/choice", {"user_id": "a", "property": payload["results"][0],
+                                                        "budget": 2_000_000})
+    assert status == 200 and payload["weights"]["interactions"] == 1
+    status, payload = call(service, "POST", "/rejection", {"user_id": "a", "properties": [LISTING]})
+    assert status == 200 and payload["weights"]["interactions"] == 2
+    status, payload = call(service, "POST", "/rejection", {"user_id": "a"})
+    assert status == 200 and payload["weights"]["interactions"] == 3
+
+
+def test_failing_query_is_isolated_in_its_batch(service, monkeypatch):
+    real = server.recommend_batch
+
+    def flaky(df, queries, weights, k=10):
+        if any(city == "boom" for _, _, city, _ in queries):
+            raise ValueError("bad city")
+        return real(df, queries, weights, k)
+
+    monkeypatch.setattr(server, "recommend_batch", flaky)
+
+    async def run():
+        return await asyncio.gather(
+            service.recommend("a", None, "Any", "Any", 3, 0, None),
+            service.recommend("b", None, "boom", "Any", 3, 0, None),
+            service.recommend("c", 2_000_000, "Maadi", "Any", 2, 1, "roi"),
+            return_exceptions=True)
+
+    good, bad, paged = asyncio.run(run())
+    assert service.stats["batches"] == 1 and service.stats["batched_queries"] == 3
+    assert isinstance(bad, ValueError)
+    assert good == real(service.df, [(("a", None), None, "Any", "Any")], {("a", None): service.prefs("a")}, k=3)[0]
+    expected = real(service.df, [("c", 2_000_000, "Maadi", "Any")], {"c": server._Weights(server.MODES["roi"])}, k=3)[0]
+    assert paged == expected[1:3]
+
+
+def test_failing_query_returns_500_to_its_caller_only(service, monkeypatch):
+    def broken(df, queries, weights, k=10):
+        raise ValueError("bad city")
+
+    monkeypatch.setattr(server, "recommend_batch", broken)
+    status, payload = call(service, "POST", "/recommend", {"user_id": "a"})
+    assert status == 500 and "bad city" in payload["error"]
+    status, payload = call(service, "GET", "/health", b"")
+    assert status == 200 and payload["listings"] == len(service.df)